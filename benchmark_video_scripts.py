@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Benchmark the grid and GIF pipelines on synthetic videos.
+Inputs are generated locally with ffmpeg's lavfi testsrc2 source for every combination of
+video count, resolution, duration and frame rate, then VideoGridMaker.make_grid,
+FrameGifMaker.make_gif and make_video_grid_recursive.py are timed end to end and per stage.
+Results are written as JSON so runs from different commits can be compared.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from make_gif_of_frames import FrameGifMaker
+from make_video_grid import build_parser as build_grid_parser
+from make_video_grid import maker_from_args
+from video_metrics import RunMetrics
+from video_process import run_process
+from video_resources import get_governor
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate_inputs(case_dir, count, resolution, duration, fps):
+    """
+    Generate count test videos named bench_<i>.mp4 in case_dir (reused if already there).
+    Durations are staggered down to 75% of duration, so the grid freezes finished cells.
+    """
+    os.makedirs(case_dir, exist_ok=True)
+    videos = []
+    for i in range(count):
+        video = os.path.join(case_dir, f"bench_{i}.mp4")
+        videos.append(video)
+        if os.path.exists(video):
+            continue
+
+        video_duration = duration * (1 - 0.25 * i / max(1, count - 1))
+        temp_path = video + ".tmp.mp4"
+        cmd = [
+            'ffmpeg', '-loglevel', 'error', '-y',
+            '-f', 'lavfi', '-i', f"testsrc2=size={resolution}:rate={fps}:duration={video_duration:.3f}",
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+            temp_path
+        ]
+        run_process(cmd, echo_stderr=True, check=True)
+        os.replace(temp_path, video)
+    return videos
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    """Silence the scripts' progress messages unless verbose."""
+    if verbose:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def bench_grid(case_dir, output_dir, options, verbose):
+    """Time VideoGridMaker.make_grid on one case. Returns (exit code, wall seconds, metrics)."""
+    args = build_grid_parser().parse_args(
+        ['--output', os.path.join(output_dir, 'bench_GRID.mp4')] + options
+    )
+    maker = maker_from_args(args)
+    maker.working_dir = case_dir
+    maker.metrics = RunMetrics()
+
+    start = time.perf_counter()
+    with quiet(verbose):
+        result = maker.make_grid()
+    return result, time.perf_counter() - start, maker.metrics.report()
+
+
+def bench_gif(case_dir, output_dir, frame_number, text, verbose):
+    """Time FrameGifMaker.make_gif on one case. Returns (exit code, wall seconds, metrics)."""
+    maker = FrameGifMaker()
+    maker.input_directory = case_dir
+    maker.file_pattern = "bench_*.mp4"
+    maker.frame_number = frame_number
+    maker.output_file = os.path.join(output_dir, 'bench.gif')
+    maker.show_labels = maker.show_title = text
+    maker.metrics = RunMetrics()
+
+    start = time.perf_counter()
+    with quiet(verbose):
+        result = maker.make_gif()
+    return result, time.perf_counter() - start, maker.metrics.report()
+
+
+def bench_recursive(case_dir, work_dir, directories, options, verbose):
+    """
+    Time make_video_grid_recursive.py over a tree of `directories` copies of one case
+    (symlinked inputs). Returns (exit code, wall seconds, metrics report of the run).
+    """
+    tree = os.path.join(work_dir, 'tree')
+    shutil.rmtree(tree, ignore_errors=True)
+    for d in range(directories):
+        subdir = os.path.join(tree, f"run_{d:03d}")
+        os.makedirs(subdir)
+        for name in sorted(os.listdir(case_dir)):
+            if name.startswith('bench_') and name.endswith('.mp4'):
+                os.symlink(os.path.join(case_dir, name), os.path.join(subdir, name))
+
+    metrics_path = os.path.join(work_dir, 'recursive_metrics.json')
+    cmd = [sys.executable, os.path.join(SCRIPT_DIR, 'make_video_grid_recursive.py'),
+           '--start-dir', tree, '--force', '--metrics', metrics_path, '--no-progress'] + options
+
+    start = time.perf_counter()
+    result = subprocess.run(cmd, check=False,
+                            stdout=None if verbose else subprocess.DEVNULL).returncode
+    wall = time.perf_counter() - start
+
+    report = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path) as f:
+            report = json.load(f)
+    return result, wall, {'wall': report.get('wall'), 'stages': report.get('totals', {})}
+
+
+def environment():
+    """Describe the machine and code version the benchmark ran on."""
+    def output(cmd):
+        try:
+            return subprocess.run(cmd, check=True, capture_output=True, text=True,
+                                  cwd=SCRIPT_DIR).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    ffmpeg_version = output(['ffmpeg', '-version'])
+    return {
+        'commit': output(['git', 'rev-parse', 'HEAD']),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'usable_cpus': get_governor().cpus,
+        'ffmpeg': ffmpeg_version.splitlines()[0] if ffmpeg_version else None,
+    }
+
+
+def case_key(result):
+    """Identify a benchmark case independently of its timings."""
+    return (result['benchmark'], result['count'], result['resolution'], result['duration'],
+            result['fps'])
+
+
+def compare(results, baseline_path):
+    """Print each case's median wall time against a baseline results file."""
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)['results']}
+
+    print(f"\nComparison with {baseline_path}:")
+    print(f"  {'case':<44} {'baseline':>9} {'current':>9} {'speedup':>8}")
+    for result in results:
+        old = baseline.get(case_key(result))
+        name = "{} n={} {} {}s {}fps".format(*case_key(result))
+        if old is None:
+            print(f"  {name:<44} {'-':>9} {result['wall']:>8.2f}s {'-':>8}")
+        else:
+            print(f"  {name:<44} {old['wall']:>8.2f}s {result['wall']:>8.2f}s "
+                  f"{old['wall'] / result['wall']:>7.2f}x")
+
+
+def main():
+    """Generate inputs, run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark make_video_grid.py, make_gif_of_frames.py and '
+                    'make_video_grid_recursive.py on synthetic testsrc2 videos.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_video_scripts.py                                   # Default matrix, results to benchmark.json
+  python benchmark_video_scripts.py --counts 4 16 --resolutions 1920x1080
+  python benchmark_video_scripts.py --benchmarks grid --repeat 3      # Median of 3 grid runs per case
+  python benchmark_video_scripts.py --compare old.json                # Compare with a previous commit's results
+  python benchmark_video_scripts.py --grid-options --profile preview --max-decoders 4
+
+Inputs are cached in --work-dir between runs; every case is run with the probe cache disabled.
+        """
+    )
+    parser.add_argument('--benchmarks', nargs='+', choices=['grid', 'gif', 'recursive'],
+                       default=['grid', 'gif', 'recursive'],
+                       help='Pipelines to benchmark (default: all)')
+    parser.add_argument('--counts', nargs='+', type=int, default=[4, 9],
+                       help='Numbers of input videos (default: 4 9)')
+    parser.add_argument('--resolutions', nargs='+', default=['320x240', '1280x720'],
+                       help='Input resolutions (default: 320x240 1280x720)')
+    parser.add_argument('--durations', nargs='+', type=float, default=[2.0],
+                       help='Longest input duration in seconds (default: 2)')
+    parser.add_argument('--fps', nargs='+', type=int, default=[30],
+                       help='Input frame rates (default: 30)')
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='Runs per case; the median wall time is reported (default: 1)')
+    parser.add_argument('--directories', type=int, default=4,
+                       help='Directories in the recursive benchmark tree (default: 4)')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='--jobs for the recursive benchmark (default: 1)')
+    parser.add_argument('--no-text', action='store_true',
+                       help='Disable labels and titles (for ffmpeg builds without drawtext)')
+    parser.add_argument('--grid-options', nargs=argparse.REMAINDER, default=[],
+                       help='Extra make_video_grid.py options (must come last)')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'video_scripts_bench'),
+                       help='Directory for generated inputs and outputs (default: <tmp>/video_scripts_bench)')
+    parser.add_argument('--output', '-o', default='benchmark.json',
+                       help='Results file (default: benchmark.json)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                       help='Compare the results with a previous results file')
+    parser.add_argument('--verbose', action='store_true',
+                       help="Show the scripts' own output")
+    args = parser.parse_args()
+
+    grid_options = ['--no-cache'] + args.grid_options
+    if args.no_text:
+        grid_options += ['--no-labels', '--no-title']
+
+    results = []
+    cases = itertools.product(args.counts, args.resolutions, args.durations, args.fps)
+    for count, resolution, duration, fps in cases:
+        case_dir = os.path.join(args.work_dir, 'inputs', f"n{count}_{resolution}_{duration:g}s_{fps}fps")
+        print(f"Case: {count} videos, {resolution}, {duration:g}s, {fps} fps")
+        generate_inputs(case_dir, count, resolution, duration, fps)
+
+        output_dir = os.path.join(args.work_dir, 'outputs')
+        os.makedirs(output_dir, exist_ok=True)
+
+        for benchmark in args.benchmarks:
+            runs = []
+            for _ in range(max(1, args.repeat)):
+                if benchmark == 'grid':
+                    run = bench_grid(case_dir, output_dir, grid_options, args.verbose)
+                elif benchmark == 'gif':
+                    run = bench_gif(case_dir, output_dir, int(duration * fps) // 2,
+                                    not args.no_text, args.verbose)
+                else:
+                    run = bench_recursive(case_dir, args.work_dir, args.directories,
+                                          grid_options + ['--jobs', str(args.jobs)], args.verbose)
+                runs.append(run)
+
+            walls = sorted(wall for _, wall, _ in runs)
+            median = walls[len(walls) // 2]
+            exit_code, _, metrics = next(run for run in runs if run[1] == median)
+            status = "✓" if all(run[0] == 0 for run in runs) else "✗"
+            print(f"  {status} {benchmark:<10} {median:8.2f}s")
+
+            results.append({
+                'benchmark': benchmark,
+                'count': count,
+                'resolution': resolution,
+                'duration': duration,
+                'fps': fps,
+                'repeat': len(runs),
+                'wall': round(median, 3),
+                'walls': [round(wall, 3) for wall in walls],
+                'result': exit_code,
+                'stages': metrics['stages'],
+            })
+
+    report = {
+        'environment': environment(),
+        'settings': {
+            'grid_options': grid_options,
+            'directories': args.directories,
+            'jobs': args.jobs,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nResults written to: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return 0 if all(result['result'] == 0 for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
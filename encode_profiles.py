@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Encoder presets shared by make_video_grid.py and make_gif_of_frames.py.
+Each profile sets the x264 speed/quality trade-off for MP4 output and the
+scaling/palette settings for GIF output. Intermediate formats are used for
+stages that are decoded again, such as grid tiles and mezzanine grids.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EncodeProfile:
+    """Encoder settings for one named profile."""
+    name: str
+    description: str
+    preset: str = None  # x264 preset (None = libx264 default, "medium")
+    crf: int = 23  # Constant rate factor, ignored for two-pass encodes
+    two_pass: bool = False  # Two-pass encode to a target bitrate
+    gif_scale_flags: str = None  # swscale flags for GIF frames (None = bicubic)
+    gif_max_colors: int = 256
+    gif_stats_mode: str = "diff"
+    gif_dither: str = "bayer:bayer_scale=5"
+
+
+ENCODE_PROFILES = {
+    'default': EncodeProfile(
+        'default', 'libx264 default preset, CRF 23'),
+    'preview': EncodeProfile(
+        'preview', 'ultrafast preset, CRF 30, for quick layout iterations',
+        preset='ultrafast', crf=30,
+        gif_scale_flags='fast_bilinear', gif_max_colors=128, gif_dither='none'),
+    'fast': EncodeProfile(
+        'fast', 'veryfast preset, CRF 26',
+        preset='veryfast', crf=26, gif_scale_flags='bilinear'),
+    'archival': EncodeProfile(
+        'archival', 'slow preset, CRF 18, best quality',
+        preset='slow', crf=18,
+        gif_scale_flags='lanczos', gif_stats_mode='full', gif_dither='sierra2_4a'),
+    'size': EncodeProfile(
+        'size', 'two-pass encode to --target-bitrate',
+        preset='medium', two_pass=True),
+}
+
+
+def get_profile(name):
+    """Look up a profile by name. Raises ValueError for unknown names."""
+    try:
+        return ENCODE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown encode profile '{name}' "
+                         f"(choose from: {', '.join(ENCODE_PROFILES)})")
+
+
+def x264_args(profile, target_bitrate=None, threads=0, lookahead=None):
+    """
+    Build libx264 output arguments for a profile.
+    Two-pass profiles need target_bitrate (e.g. "2M"); add -pass/-passlogfile separately.
+    """
+    args = ['-c:v', 'libx264']
+    if profile.preset:
+        args.extend(['-preset', profile.preset])
+
+    if profile.two_pass:
+        if not target_bitrate:
+            raise ValueError(f"Profile '{profile.name}' requires a target bitrate")
+        args.extend(['-b:v', str(target_bitrate)])
+    else:
+        args.extend(['-crf', str(profile.crf)])
+
+    if threads:
+        args.extend(['-threads', str(threads)])
+    if lookahead is not None:
+        args.extend(['-rc-lookahead', str(lookahead)])
+
+    args.extend(['-pix_fmt', 'yuv420p'])
+    return args
+
+
+def profile_help():
+    """Return a one-line-per-profile description for --help output."""
+    return "\n".join(f"  {p.name:<10} {p.description}" for p in ENCODE_PROFILES.values())
+
+
+# Formats for intermediate stages (tiles, mezzanine grids) that are decoded again later.
+# Lossless/intra-only streams avoid generational loss and are cheap to decode; yuv444p
+# keeps full chroma and allows the odd frame sizes that cell padding can produce.
+INTERMEDIATE_FORMATS = {
+    'x264-lossless': ['-c:v', 'libx264', '-qp', '0', '-preset', 'ultrafast', '-pix_fmt', 'yuv444p'],
+    'ffv1': ['-c:v', 'ffv1', '-level', '3', '-g', '1', '-slices', '4', '-pix_fmt', 'yuv444p'],
+    'x264': ['-c:v', 'libx264', '-crf', '23', '-pix_fmt', 'yuv444p'],
+}
+
+
+def intermediate_args(name, threads=0):
+    """Build output arguments for an intermediate encode (written to a .mkv file)."""
+    try:
+        args = list(INTERMEDIATE_FORMATS[name])
+    except KeyError:
+        raise ValueError(f"Unknown intermediate format '{name}' "
+                         f"(choose from: {', '.join(INTERMEDIATE_FORMATS)})")
+    if threads:
+        args.extend(['-threads', str(threads)])
+    return args
@@ -5,14 +5,25 @@ Each frame is displayed for a configurable duration (default 0.2s).
 """
 
 import argparse
+import contextlib
 import glob
 import os
 import re
-import subprocess
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from encode_profiles import ENCODE_PROFILES, get_profile, profile_help
+from video_cache import PaletteCache, ProbeCache
+from video_metrics import RunMetrics, timed, write_report
+from video_plan import frame_count, input_records, write_plan
+from video_probe import DEFAULT_PROBE_WORKERS, probe_videos
+from video_process import (DEFAULT_MAX_PROCESSES, DEFAULT_RETRIES, ProcessGroup, configure_processes,
+                           get_engine)
+from video_progress import run_ffmpeg
+from video_resources import get_governor
+
 
 class FrameGifMaker:
     """Create a GIF from frames extracted from multiple videos."""
@@ -25,6 +36,7 @@ class FrameGifMaker:
         # Output settings
         self.output_file = ""
         self.max_width = 640
+        self.encode_profile = "default"  # Scaling/palette settings (see encode_profiles.py)
 
         # Label settings
         self.show_labels = True
@@ -46,31 +58,36 @@ class FrameGifMaker:
         self.input_directory = None
         self.file_pattern = "*.mp4"  # Glob pattern for finding videos
 
+        # Frame seeking: 'auto' seeks by timestamp when the frame rate is constant,
+        # 'fast' always seeks, 'exact' always decodes from the start with select
+        self.seek_mode = "auto"
+
+        # Number of frames extracted concurrently, and decoder threads per extraction
+        # (0 = ffmpeg decides; make_gif splits the CPUs between the workers)
+        self.workers = min(8, get_governor().cpus)
+        self.extract_threads = 0
+
+        # Build the GIF with one ffmpeg run and no temporary frame files
+        self.single_pass = False
+
+        # Number of concurrent ffprobe processes
+        self.probe_workers = DEFAULT_PROBE_WORKERS
+        self.probe_cache = None  # Optional ProbeCache shared across runs
+        self.palette_cache = None  # Optional PaletteCache shared across runs
+
+        # Dry run: build self.plan with the ffmpeg commands instead of running them
+        self.plan_only = False
+        self.plan = None
+
+        # Optional RunMetrics collecting per-stage timings and ffmpeg -progress stats
+        self.metrics = None
+
+        # ffmpeg runs of the current make_gif, cancelled together when an extraction fails
+        self.process_group = ProcessGroup()
+
         # Verbosity
         self.verbose = os.environ.get('FFMPEG_VERBOSE', 'false').lower() == 'true'
 
-    def get_video_dimensions(self, video_path):
-        """Get dimensions of a video using ffprobe."""
-        try:
-            width_cmd = [
-                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=width',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            width = int(subprocess.check_output(width_cmd).decode().strip())
-
-            height_cmd = [
-                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=height',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            height = int(subprocess.check_output(height_cmd).decode().strip())
-
-            return width, height
-        except Exception as e:
-            print(f"Error getting dimensions for {video_path}: {e}", file=sys.stderr)
-            return None, None
-
     def find_videos(self, directory=None):
         """Find all MP4 files in directory and extract video numbers."""
         search_dir = directory or "."
@@ -106,12 +123,51 @@ class FrameGifMaker:
 
         return videos, video_numbers, common_name
 
-    def extract_frame(self, video_path, frame_num, output_path, width, label_text=None):
-        """Extract a specific frame from a video and optionally add label."""
-        loglevel = "info" if self.verbose else "error"
+    def get_videos_metadata(self, videos):
+        """Probe all videos concurrently. Returns None if any video fails."""
+        with timed(self.metrics, 'probe'):
+            metadata_list = probe_videos(videos, max_workers=self.probe_workers,
+                                         cache=self.probe_cache)
+        if any(metadata is None for metadata in metadata_list):
+            return None
+        return metadata_list
+
+    def can_fast_seek(self, metadata):
+        """
+        Check whether frame timestamps can be derived from the probed frame rate.
+        Variable frame rate videos (r_frame_rate != avg_frame_rate) need exact selection.
+        """
+        if metadata is None or metadata.fps <= 0 or metadata.avg_fps <= 0:
+            return False
+        return abs(metadata.fps - metadata.avg_fps) <= 0.01 * metadata.fps
 
-        # Build filter chain
-        filters = [f"select=eq(n\\,{frame_num})", f"scale={width}:-1"]
+    def use_fast_seek(self, metadata):
+        """Decide whether to seek by timestamp for a video, according to seek_mode."""
+        if metadata is None or metadata.fps <= 0:
+            return False
+        return self.seek_mode == 'fast' or (self.seek_mode == 'auto' and self.can_fast_seek(metadata))
+
+    @staticmethod
+    def seek_time(frame_num, fps):
+        """
+        Input seek position for frame N. Input seeking is frame-accurate: ffmpeg decodes from
+        the preceding keyframe and drops frames before the target. Aim half a frame early to
+        absorb rounding.
+        """
+        return max(0.0, (frame_num - 0.5) / fps)
+
+    def build_frame_filters(self, frame_num, width, label_text, title, exact, height=-1):
+        """
+        Build the per-frame filters: frame selection (when exact), scaling, label and title bar.
+        height=-1 keeps the aspect ratio.
+        """
+        profile = get_profile(self.encode_profile)
+        scale_filter = f"scale={width}:{height}"
+        if profile.gif_scale_flags:
+            scale_filter += f":flags={profile.gif_scale_flags}"
+        filters = [scale_filter]
+        if exact:
+            filters.insert(0, f"select=eq(n\\,{frame_num})")
 
         # Add label if enabled
         if self.show_labels and label_text:
@@ -126,61 +182,127 @@ class FrameGifMaker:
                 f"fontcolor={self.label_color}:fontsize={self.label_size}{box_params}"
             )
 
+        # Add the title bar in the same pass rather than re-encoding the PNG
+        if title:
+            title_escaped = title.replace("'", r"'\''")
+            filters.append(
+                f"pad=iw:ih+{self.title_padding}:0:{self.title_padding}:black,"
+                f"drawtext=text='{title_escaped}':x=(w-tw)/2:"
+                f"y=({self.title_padding}-th)/2:fontcolor=white:fontsize=36:"
+                f"box=1:boxcolor=black@0.7"
+            )
+
+        return filters
+
+    def extract_frame(self, video_path, frame_num, output_path, width, label_text=None,
+                      metadata=None, title=None):
+        """
+        Extract a specific frame from a video and optionally add label and title bar.
+        With fast seeking, ffmpeg seeks to the keyframe before the frame's timestamp
+        and only decodes from there, instead of decoding every frame from the start.
+        """
+        if self.use_fast_seek(metadata):
+            if self._extract_frame(video_path, frame_num, output_path, width, label_text,
+                                   title, fps=metadata.fps):
+                return True
+            if self.verbose:
+                print(f"Fast seek failed for {video_path}, falling back to exact frame selection")
+
+        return self._extract_frame(video_path, frame_num, output_path, width, label_text, title)
+
+    def run_ffmpeg(self, cmd):
+        """Run an ffmpeg command (output captured unless verbose) and return the CompletedProcess."""
+        return run_ffmpeg(cmd, capture_output=not self.verbose, metrics=self.metrics,
+                          group=self.process_group)
+
+    def build_extract_command(self, video_path, frame_num, output_path, width, label_text, title,
+                              fps=None):
+        """Build the ffmpeg command for one extraction (seeking by timestamp if fps is given)."""
+        loglevel = "info" if self.verbose else "error"
+
+        filters = self.build_frame_filters(frame_num, width, label_text, title, exact=fps is None)
         filter_str = ",".join(filters)
 
-        cmd = [
-            'ffmpeg', '-loglevel', loglevel, '-y',
+        cmd = ['ffmpeg', '-loglevel', loglevel, '-y']
+        if self.extract_threads:
+            cmd.extend(['-threads', str(self.extract_threads)])
+        if fps is not None:
+            cmd.extend(['-ss', f"{self.seek_time(frame_num, fps):.6f}"])
+        cmd.extend([
             '-i', video_path,
             '-vf', filter_str,
             '-vframes', '1',
             output_path
-        ]
+        ])
+        return cmd
+
+    def _extract_frame(self, video_path, frame_num, output_path, width, label_text, title,
+                       fps=None):
+        """Run one extraction: seek by timestamp if fps is given, else select frame N exactly."""
+        if self.process_group.cancelled:
+            return False
+        cmd = self.build_extract_command(video_path, frame_num, output_path, width, label_text,
+                                         title, fps)
 
         if self.verbose:
-            print(f"Extracting frame {frame_num} from {video_path}")
+            mode = "seeking" if fps is not None else "exact select"
+            print(f"Extracting frame {frame_num} from {video_path} ({mode})")
 
         try:
-            result = subprocess.run(cmd, check=False, capture_output=not self.verbose)
-            return result.returncode == 0
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            result = self.run_ffmpeg(cmd)
+            # Seeking past the end exits cleanly without writing a frame
+            return result.returncode == 0 and os.path.exists(output_path)
         except Exception as e:
-            print(f"Error extracting frame from {video_path}: {e}", file=sys.stderr)
+            if not self.process_group.cancelled:
+                print(f"Error extracting frame from {video_path}: {e}", file=sys.stderr)
             return False
 
-    def add_title_to_image(self, input_path, output_path, title, width):
-        """Add a title bar to the top of an image."""
-        loglevel = "info" if self.verbose else "error"
-
-        title_escaped = title.replace("'", r"'\''")
+    def build_palettegen_filter(self):
+        """Return the palettegen filter for the current encode profile."""
+        profile = get_profile(self.encode_profile)
+        return (f'palettegen=max_colors={profile.gif_max_colors}:'
+                f'stats_mode={profile.gif_stats_mode}')
 
-        # Pad the image at the top and add title text
-        filter_str = (
-            f"pad=iw:ih+{self.title_padding}:0:{self.title_padding}:black,"
-            f"drawtext=text='{title_escaped}':x=(w-tw)/2:"
-            f"y=({self.title_padding}-th)/2:fontcolor=white:fontsize=36:"
-            f"box=1:boxcolor=black@0.7"
-        )
+    def build_palette_command(self, concat_file, palette_path):
+        """Build the palette generation pass over the frames listed in concat_file."""
+        loglevel = "info" if self.verbose else "error"
+        return [
+            'ffmpeg', '-loglevel', loglevel, '-y',
+            '-f', 'concat', '-safe', '0', '-i', concat_file,
+            '-vf', self.build_palettegen_filter(),
+            palette_path
+        ]
 
-        cmd = [
+    def build_gif_command(self, concat_file, palette_path, output_path):
+        """Build the GIF encoding pass that maps the frames onto the palette."""
+        loglevel = "info" if self.verbose else "error"
+        profile = get_profile(self.encode_profile)
+        return [
             'ffmpeg', '-loglevel', loglevel, '-y',
-            '-i', input_path,
-            '-vf', filter_str,
+            '-f', 'concat', '-safe', '0', '-i', concat_file,
+            '-i', palette_path,
+            '-lavfi', f'paletteuse=dither={profile.gif_dither}',
+            '-loop', '0',
             output_path
         ]
 
-        try:
-            result = subprocess.run(cmd, check=False, capture_output=not self.verbose)
-            return result.returncode == 0
-        except Exception as e:
-            print(f"Error adding title: {e}", file=sys.stderr)
-            return False
+    def create_gif_from_frames(self, frame_paths, output_path, workspace=None):
+        """
+        Create a GIF from a list of frame images.
+        Intermediate files (concat list, palette) go in workspace, a directory private to this
+        job; a temporary one is created if not given, so concurrent GIF builds never collide.
+        """
+        if workspace is None:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                return self.create_gif_from_frames(frame_paths, output_path, temp_dir)
 
-    def create_gif_from_frames(self, frame_paths, output_path):
-        """Create a GIF from a list of frame images."""
         loglevel = "info" if self.verbose else "error"
 
         # Create a concat demuxer file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            concat_file = f.name
+        concat_file = os.path.join(workspace, 'frames.txt')
+        with open(concat_file, 'w') as f:
             for frame_path in frame_paths:
                 f.write(f"file '{frame_path}'\n")
                 f.write(f"duration {self.frame_duration}\n")
@@ -188,22 +310,29 @@ class FrameGifMaker:
             if frame_paths:
                 f.write(f"file '{frame_paths[-1]}'\n")
 
-        try:
+        palettegen = self.build_palettegen_filter()
+
+        # Reuse a cached palette for identical frames and palettegen options
+        palette_key = None
+        palette_path = None
+        if self.palette_cache is not None:
+            palette_key = self.palette_cache.key(frame_paths, palettegen)
+            palette_path = self.palette_cache.get(palette_key)
+            if palette_path and self.verbose:
+                print("Using cached color palette")
+
+        if palette_path is None:
             # Generate palette for better GIF quality
-            palette_path = os.path.join(tempfile.gettempdir(), 'palette.png')
+            palette_path = os.path.join(workspace, 'palette.png')
 
             # First pass: generate palette
-            palette_cmd = [
-                'ffmpeg', '-loglevel', loglevel, '-y',
-                '-f', 'concat', '-safe', '0', '-i', concat_file,
-                '-vf', 'palettegen=stats_mode=diff',
-                palette_path
-            ]
+            palette_cmd = self.build_palette_command(concat_file, palette_path)
 
             if self.verbose:
                 print("Generating color palette...")
 
-            result = subprocess.run(palette_cmd, check=False, capture_output=not self.verbose)
+            with timed(self.metrics, 'palette'):
+                result = self.run_ffmpeg(palette_cmd)
             if result.returncode != 0:
                 print("Warning: Palette generation failed, using default palette")
                 # Fallback: create GIF without palette
@@ -213,37 +342,162 @@ class FrameGifMaker:
                     '-loop', '0',
                     output_path
                 ]
-                result = subprocess.run(cmd, check=False, capture_output=not self.verbose)
+                with timed(self.metrics, 'encode'):
+                    result = self.run_ffmpeg(cmd)
                 return result.returncode == 0
 
-            # Second pass: create GIF using palette
-            gif_cmd = [
-                'ffmpeg', '-loglevel', loglevel, '-y',
-                '-f', 'concat', '-safe', '0', '-i', concat_file,
-                '-i', palette_path,
-                '-lavfi', 'paletteuse=dither=bayer:bayer_scale=5',
-                '-loop', '0',
-                output_path
-            ]
+            if palette_key is not None:
+                self.palette_cache.put(palette_key, palette_path)
 
-            if self.verbose:
-                print("Creating GIF...")
+        # Second pass: create GIF using palette
+        gif_cmd = self.build_gif_command(concat_file, palette_path, output_path)
+
+        if self.verbose:
+            print("Creating GIF...")
+
+        with timed(self.metrics, 'encode'):
+            result = self.run_ffmpeg(gif_cmd)
+        return result.returncode == 0
+
+    def build_single_pass_command(self, videos, labels, metadata_list, title, width, height,
+                                  output_path):
+        """
+        Build the single-pass command: open every video once, pick the target frame from each,
+        concat the frames in the filtergraph, and generate/apply the palette inline with
+        split+palettegen+paletteuse.
+        """
+        loglevel = "info" if self.verbose else "error"
+        profile = get_profile(self.encode_profile)
+        n = len(videos)
+
+        cmd = ['ffmpeg', '-loglevel', loglevel, '-y']
+        chains = []
+        for i, (video, label, metadata) in enumerate(zip(videos, labels, metadata_list)):
+            fast = self.use_fast_seek(metadata)
+            if fast:
+                cmd.extend(['-ss', f"{self.seek_time(self.frame_number, metadata.fps):.6f}"])
+            cmd.extend(['-i', video])
+
+            # Every frame must have the same size for concat
+            filters = self.build_frame_filters(self.frame_number, width,
+                                               self.label_format % label, title,
+                                               exact=not fast, height=height)
+            chain = f"[{i}:v]" + ",".join(filters) + ",trim=end_frame=1,setsar=1,setpts=PTS-STARTPTS"
+            if i == n - 1:
+                # Repeat the last frame so it is shown for its full duration,
+                # as the concat demuxer path does
+                chain += f",split[f{i}][f{n}]"
+            else:
+                chain += f"[f{i}]"
+            chains.append(chain)
+
+        refs = "".join(f"[f{i}]" for i in range(n + 1))
+        chains.append(
+            f"{refs}concat=n={n + 1}:v=1:a=0,settb=AVTB,setpts=N*{self.frame_duration}/TB,"
+            f"split[a][b];"
+            f"[a]{self.build_palettegen_filter()}[p];"
+            f"[b][p]paletteuse=dither={profile.gif_dither}"
+        )
 
-            result = subprocess.run(gif_cmd, check=False, capture_output=not self.verbose)
+        cmd.extend(['-filter_complex', ";".join(chains), '-loop', '0', output_path])
+        return cmd
 
-            # Cleanup palette
-            if os.path.exists(palette_path):
-                os.remove(palette_path)
+    def create_gif_single_pass(self, videos, labels, metadata_list, title, width, height,
+                               output_path):
+        """
+        Build the whole GIF with one ffmpeg run (see build_single_pass_command).
+        No temporary files are written. Returns True on success, False on failure, and None
+        (with the GIF removed) if a frame came out missing, e.g. because a seek landed past
+        the end of an input; the caller then extracts the frames one at a time.
+        """
+        cmd = self.build_single_pass_command(videos, labels, metadata_list, title, width, height,
+                                             output_path)
 
-            return result.returncode == 0
+        if self.verbose:
+            print(f"Filtergraph: {cmd[cmd.index('-filter_complex') + 1]}")
 
-        finally:
-            # Cleanup concat file
-            if os.path.exists(concat_file):
-                os.remove(concat_file)
+        try:
+            with timed(self.metrics, 'encode'):
+                result = self.run_ffmpeg(cmd)
+            if result.returncode != 0 and not self.verbose:
+                print(result.stderr, file=sys.stderr)
+            if result.returncode != 0:
+                return False
+            # An input without its frame silently drops out of the concat
+            frames = result.progress['frames']
+            expected = len(videos) + 1  # The last frame is repeated
+            if frames is not None and frames < expected:
+                print(f"Single pass produced {frames} of {expected} frames")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                return None
+            return True
+        except Exception as e:
+            print(f"Error creating GIF: {e}", file=sys.stderr)
+            return False
+
+    def build_plan(self, videos, labels, metadata_list, title, width):
+        """
+        Describe the run for a dry-run plan: the inputs, every ffmpeg command, the frame size
+        and cost estimates. Temporary files are shown under a <workspace> placeholder.
+        Decoded frame counts are upper bounds: fast seeking only decodes from the keyframe
+        before each target frame.
+        """
+        orig_width, orig_height = metadata_list[0].width, metadata_list[0].height
+        height = int(round(orig_height * width / orig_width))
+        title_height = self.title_padding if title else 0
+
+        if self.single_pass:
+            commands = [self.build_single_pass_command(videos, labels, metadata_list, title,
+                                                       width, height, self.output_file)]
+        else:
+            workspace = "<workspace>"
+            commands = []
+            for i, (video, label, metadata) in enumerate(zip(videos, labels, metadata_list)):
+                fps = metadata.fps if self.use_fast_seek(metadata) else None
+                commands.append(self.build_extract_command(
+                    video, self.frame_number, os.path.join(workspace, f"frame_{i:04d}.png"),
+                    width, self.label_format % label, title, fps
+                ))
+            concat_file = os.path.join(workspace, 'frames.txt')
+            palette_path = os.path.join(workspace, 'palette.png')
+            commands.append(self.build_palette_command(concat_file, palette_path))
+            commands.append(self.build_gif_command(concat_file, palette_path, self.output_file))
+
+        decoded_frames = 0
+        decoded_pixels = 0
+        for metadata in metadata_list:
+            frames = min(self.frame_number + 1, frame_count(metadata))
+            decoded_frames += frames
+            decoded_pixels += frames * metadata.width * metadata.height
+
+        n = len(videos)
+        return {
+            'script': 'make_gif_of_frames.py',
+            'output': self.output_file,
+            'commands': commands,
+            'inputs': [dict(record, fast_seek=self.use_fast_seek(metadata))
+                       for record, metadata in zip(input_records(metadata_list), metadata_list)],
+            'geometry': {
+                'frame_width': width,
+                'frame_height': height,
+                'title_height': title_height,
+                'output_width': width,
+                'output_height': height + title_height,
+            },
+            'estimates': {
+                'duration': n * self.frame_duration,
+                'output_frames': n,
+                'decoded_frames_max': decoded_frames,
+                'decoded_pixels_max': decoded_pixels,
+                'encoded_pixels': n * width * (height + title_height),
+            },
+        }
 
     def make_gif(self):
         """Main function to create the GIF from video frames."""
+        self.process_group = ProcessGroup()
+
         # Use user-provided videos or auto-detect
         if self.user_videos:
             videos = self.user_videos
@@ -275,56 +529,96 @@ class FrameGifMaker:
         n = len(videos)
         print(f"Extracting frame {self.frame_number} from each video...")
 
-        # Get dimensions from first video
-        orig_width, orig_height = self.get_video_dimensions(videos[0])
-        if orig_width is None:
+        # Probe all videos (frame rates are needed to seek to the frame)
+        metadata_list = self.get_videos_metadata(videos)
+        if metadata_list is None:
             return 1
+
+        # Get dimensions from first video
+        orig_width, orig_height = metadata_list[0].width, metadata_list[0].height
         print(f"Original video size: {orig_width}x{orig_height}")
 
         # Calculate scaled width
         cell_width = min(self.max_width, orig_width)
         print(f"Output frame width: {cell_width}")
 
-        # Create temporary directory for frames
-        with tempfile.TemporaryDirectory() as temp_dir:
-            frame_paths = []
-
-            for i, (video, label) in enumerate(zip(videos, video_labels)):
-                # Build label text with format
-                label_text = self.label_format % label
-
-                # Extract frame
-                frame_path = os.path.join(temp_dir, f"frame_{i:04d}.png")
-                success = self.extract_frame(
-                    video, self.frame_number, frame_path, cell_width, label_text
-                )
-
-                if not success:
-                    print(f"Failed to extract frame from {video}")
-                    return 1
-
-                # Add title if enabled
-                if self.show_title and common_name:
-                    titled_path = os.path.join(temp_dir, f"titled_{i:04d}.png")
-                    if self.add_title_to_image(frame_path, titled_path, common_name, cell_width):
-                        frame_paths.append(titled_path)
-                    else:
-                        frame_paths.append(frame_path)
-                else:
-                    frame_paths.append(frame_path)
+        # Determine output filename
+        if not self.output_file:
+            base_name = common_name or "output"
+            self.output_file = f"{base_name}_frame{self.frame_number}.gif"
+
+        title = common_name if self.show_title else None
+
+        # Split the CPUs between the concurrent extractions so they don't oversubscribe
+        governor = get_governor()
+        workers = max(1, min(self.workers, n, governor.cpus))
+        self.extract_threads = governor.threads_for(workers)
+        if not self.single_pass:
+            print(f"Resources: {governor.describe()}; {workers} extractions at a time"
+                  + (f" with {self.extract_threads} decoder threads each"
+                     if self.extract_threads else ""))
+
+        if self.plan_only:
+            self.plan = self.build_plan(videos, video_labels, metadata_list, title, cell_width)
+            print(f"✓ Planned {len(self.plan['commands'])} ffmpeg command(s)")
+            return 0
+
+        if self.single_pass:
+            # All frames must share one size to be concatenated in the filtergraph
+            cell_height = int(round(orig_height * cell_width / orig_width))
+            print(f"\nCreating GIF in a single ffmpeg pass: {self.output_file}")
+            print(f"  - {n} frames at {self.frame_duration}s each = {n * self.frame_duration:.1f}s total")
 
-                print(f"  [{i+1}/{n}] Extracted from {os.path.basename(video)}")
+            success = self.create_gif_single_pass(videos, video_labels, metadata_list, title,
+                                                  cell_width, cell_height, self.output_file)
+            if success:
+                print(f"✓ GIF created successfully: {self.output_file}")
+                return 0
+            elif success is False:
+                print("✗ Failed to create GIF")
+                return 1
+            # Extracting frame by frame falls back to exact selection where a seek fails
+            print("Falling back to extracting the frames one at a time")
 
-            # Determine output filename
-            if not self.output_file:
-                base_name = common_name or "output"
-                self.output_file = f"{base_name}_frame{self.frame_number}.gif"
+        # Create temporary directory for frames
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Index-ordered slots keep the GIF frame order independent of completion order
+            frame_paths = [None] * n
+            with timed(self.metrics, 'extract'), ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for i, (video, label, metadata) in enumerate(zip(videos, video_labels, metadata_list)):
+                    # Build label text with format
+                    label_text = self.label_format % label
+
+                    # Extract frame, with the title bar if enabled
+                    frame_path = os.path.join(temp_dir, f"frame_{i:04d}.png")
+                    future = executor.submit(
+                        self.extract_frame, video, self.frame_number, frame_path, cell_width,
+                        label_text, metadata, title=title
+                    )
+                    futures[future] = (i, video, frame_path)
+
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i, video, frame_path = futures[future]
+
+                    if not future.result():
+                        print(f"Failed to extract frame from {video}")
+                        # Drop queued extractions and stop the running ones (which can take
+                        # minutes with exact frame selection) before the temp dir goes
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        get_engine().cancel_group(self.process_group)
+                        executor.shutdown(wait=True)
+                        return 1
+
+                    frame_paths[i] = frame_path
+
+                    print(f"  [{done}/{n}] Extracted from {os.path.basename(video)}")
 
             print(f"\nCreating GIF: {self.output_file}")
             print(f"  - {n} frames at {self.frame_duration}s each = {n * self.frame_duration:.1f}s total")
 
             # Create the GIF
-            success = self.create_gif_from_frames(frame_paths, self.output_file)
+            success = self.create_gif_from_frames(frame_paths, self.output_file, temp_dir)
 
             if success:
                 print(f"✓ GIF created successfully: {self.output_file}")
@@ -349,6 +643,8 @@ Examples:
   python make_gif_of_frames.py --no-title                   # GIF without title
   python make_gif_of_frames.py --no-labels                  # GIF without frame labels
   python make_gif_of_frames.py --label-format "Run %s"      # Custom label format
+  python make_gif_of_frames.py --single-pass                # One ffmpeg run, no temp files
+  python make_gif_of_frames.py --plan > plan.json           # Show the ffmpeg commands without running them
 
   # Explicit videos with captions:
   python make_gif_of_frames.py --videos a.mp4 b.mp4 --captions "First" "Second"
@@ -356,7 +652,9 @@ Examples:
 
 Expected input: MP4 files named like experiment_0.mp4, experiment_1.mp4, etc.
 Or use --videos to explicitly specify video files, or --pattern to filter by glob pattern.
-        """
+
+Encode profiles (--profile, only the GIF scaling/palette settings apply):
+""" + profile_help()
     )
 
     # Frame selection options
@@ -365,6 +663,9 @@ Or use --videos to explicitly specify video files, or --pattern to filter by glo
                             help='Frame number to extract from each video (0-indexed, default: 0)')
     frame_group.add_argument('--duration', '-d', type=float, default=0.2,
                             help='Duration to display each frame in seconds (default: 0.2)')
+    frame_group.add_argument('--seek', choices=['auto', 'fast', 'exact'], default='auto',
+                            help='Frame lookup: seek by timestamp (fast), decode from the start (exact), '
+                                 'or fast unless the frame rate is variable (auto, default)')
 
     # Input options
     input_group = parser.add_argument_group('Input Options')
@@ -409,6 +710,35 @@ Or use --videos to explicitly specify video files, or --pattern to filter by glo
                              help='Output filename (default: <video_name>_frameN.gif)')
     output_group.add_argument('--width', type=int, default=640,
                              help='Maximum width for frames (default: 640)')
+    output_group.add_argument('--profile', choices=list(ENCODE_PROFILES), default='default',
+                             help='Encode profile for scaling and palette quality (default: default)')
+    output_group.add_argument('--workers', '-j', type=int, default=min(8, get_governor().cpus),
+                             help='Number of frames to extract concurrently (default: min(8, CPUs))')
+    output_group.add_argument('--single-pass', action='store_true',
+                             help='Build the GIF in one ffmpeg run without temporary frame files '
+                                  '(frames are scaled to the first video\'s size)')
+
+    output_group.add_argument('--plan', nargs='?', const='-', metavar='FILE',
+                             help='Only probe the inputs and print (or write to FILE) a JSON plan '
+                                  'with the ffmpeg commands, frame size and cost estimates')
+    output_group.add_argument('--metrics', metavar='FILE',
+                             help='Write per-stage timings, child CPU/RSS and ffmpeg speed as JSON')
+
+    # Process options
+    process_group = parser.add_argument_group('Process Options')
+    process_group.add_argument('--max-processes', type=int, default=None,
+                              help=f'Maximum concurrent ffmpeg/ffprobe processes (default: {DEFAULT_MAX_PROCESSES})')
+    process_group.add_argument('--timeout', type=float, default=None,
+                              help='Stop any ffmpeg/ffprobe run that takes longer than this many seconds')
+    process_group.add_argument('--retries', type=int, default=None,
+                              help=f'Retries after transient failures, e.g. out of memory (default: {DEFAULT_RETRIES})')
+
+    # Cache options
+    cache_group = parser.add_argument_group('Cache Options')
+    cache_group.add_argument('--no-cache', action='store_true',
+                            help='Bypass the persistent ffprobe metadata and palette caches')
+    cache_group.add_argument('--clear-cache', action='store_true',
+                            help='Clear the ffprobe metadata and palette caches before running')
 
     args = parser.parse_args()
 
@@ -418,6 +748,7 @@ Or use --videos to explicitly specify video files, or --pattern to filter by glo
     # Frame options
     maker.frame_number = args.frame
     maker.frame_duration = args.duration
+    maker.seek_mode = args.seek
 
     # Input options
     maker.input_directory = args.directory
@@ -442,9 +773,44 @@ Or use --videos to explicitly specify video files, or --pattern to filter by glo
     # Output options
     maker.output_file = args.output
     maker.max_width = args.width
-
-    # Create the GIF
-    return maker.make_gif()
+    maker.encode_profile = args.profile
+    maker.single_pass = args.single_pass
+    maker.workers = args.workers
+    maker.plan_only = args.plan is not None
+    if args.metrics:
+        maker.metrics = RunMetrics()
+
+    # Process options
+    configure_processes(max_processes=args.max_processes, timeout=args.timeout,
+                        retries=args.retries)
+
+    if not args.no_cache:
+        maker.probe_cache = ProbeCache()
+        maker.palette_cache = PaletteCache()
+        if args.clear_cache:
+            maker.probe_cache.clear()
+            maker.palette_cache.clear()
+
+    # With a plan on stdout, progress messages go to stderr
+    plan_to_stdout = args.plan == '-'
+    with contextlib.redirect_stdout(sys.stderr) if plan_to_stdout else contextlib.nullcontext():
+        # Create the GIF
+        result = maker.make_gif()
+
+        if maker.probe_cache:
+            print(maker.probe_cache.summary())
+            maker.probe_cache.close()
+        if maker.palette_cache and (maker.palette_cache.hits or maker.palette_cache.misses):
+            print(maker.palette_cache.summary())
+
+    if maker.plan is not None and result == 0:
+        write_plan(maker.plan, args.plan)
+
+    if maker.metrics:
+        write_report(dict(maker.metrics.report(), script='make_gif_of_frames.py', result=result),
+                     args.metrics)
+
+    return result
 
 
 if __name__ == '__main__':
@@ -5,19 +5,51 @@ Creates a grid video from MP4 files matching pattern <video_name>_<number>.mp4
 """
 
 import argparse
+import contextlib
 import fnmatch
 import glob
+import hashlib
+import json
 import math
 import os
 import re
-import subprocess
+import secrets
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from encode_profiles import (ENCODE_PROFILES, INTERMEDIATE_FORMATS, get_profile, intermediate_args,
+                             profile_help, x264_args)
+from video_cache import ProbeCache, ProxyCache
+from video_metrics import RunMetrics, timed, write_report
+from video_outputs import parse_output_target
+from video_plan import frame_count, input_records, write_plan
+from video_probe import DEFAULT_PROBE_WORKERS, probe_video, probe_videos
+from video_process import (DEFAULT_MAX_PROCESSES, DEFAULT_RETRIES, ProcessGroup, configure_processes,
+                           get_engine)
+from video_progress import ProgressDisplay, run_ffmpeg
+from video_resources import get_governor
+
+# Suffix of generated grid videos; such files are never picked up as inputs
+GRID_SUFFIX = "_GRID.mp4"
+
 
 class VideoGridMaker:
     """Create a grid video from multiple MP4 files."""
 
+    # Settings that change the rendered output and therefore the fingerprint
+    FINGERPRINT_OPTIONS = (
+        'show_title', 'title_padding', 'max_width', 'padding_percent', 'freeze_frame_offset',
+        'show_labels', 'label_size', 'label_color', 'label_position', 'label_format',
+        'label_box', 'label_box_color', 'vertical_stack',
+        'encode_profile', 'target_bitrate', 'lookahead', 'extra_outputs',
+    )
+
+    # Settings that only affect the title and final encode, not the composited cells
+    TITLE_OPTIONS = ('show_title', 'title_padding', 'encode_profile', 'target_bitrate', 'lookahead',
+                     'extra_outputs')
+
     def __init__(self):
         # Default settings
         self.show_title = True
@@ -48,59 +80,100 @@ class VideoGridMaker:
         self.patterns = None  # Include patterns (glob-style)
         self.excludes = None  # Exclude patterns (glob-style)
 
+        # Directory to search for videos and write the output to (None = current directory)
+        self.working_dir = None
+        # MP4 files of working_dir already listed by a directory scan, {path: (size, mtime_ns)}
+        # (see video_scan.py); used instead of listing and stat-ing the directory again
+        self.scanned_files = None
+        # Metadata probed ahead of time, e.g. by a pipeline stage, {path: VideoMetadata}
+        self.probed_metadata = None
+
+        # Capture ffmpeg output and re-print it through sys.stdout (for buffered callers)
+        self.capture_output = False
+
+        # Incremental builds: record a fingerprint sidecar next to the output,
+        # and skip the encode when the recorded fingerprint still matches
+        self.record_fingerprint = False
+        self.skip_if_fresh = False
+        self.skipped_fresh = False  # Set by make_grid when the output was up to date
+        # Set by make_grid: the output it builds and that output's fingerprint (if recorded)
+        self.output_path = None
+        self.output_fingerprint = None
+        # ffmpeg runs of the current make_grid, so that they can be cancelled together
+        # (e.g. when a tile fails) without touching other runs of the process engine
+        self.process_group = ProcessGroup()
+
+        # Encoder settings (see encode_profiles.py)
+        self.encode_profile = "default"
+        self.target_bitrate = None  # Required by two-pass profiles, e.g. "2M"
+        self.lookahead = None  # x264 rc-lookahead frames (None = preset default)
+
+        # Extra outputs rendered from the same decode as the grid, as specs such as
+        # "gif:fps=10", "poster:time=2" or "preview:width=320" (see video_outputs.py)
+        self.extra_outputs = []
+        self.output_targets = []  # Set by make_grid: the parsed OutputTargets, paths resolved
+
+        # Thread limit for ffmpeg filtering and encoding (0 = set from cpu_budget)
+        self.threads = 0
+        # CPUs this grid may keep busy, split between its concurrent ffmpeg runs
+        # (0 = every CPU the resource governor detects)
+        self.cpu_budget = 0
+
+        # Tiled mode: grids with more inputs than max_decoders are built from sub-grid
+        # tiles of at most max_decoders inputs (0 = one filtergraph for all inputs)
+        self.max_decoders = 0
+        self.tile_jobs = min(4, get_governor().cpus)  # Tiles encoded in parallel
+
+        # Multi-stage builds: intermediate stages use a lossless/intra format, and only the
+        # final stage is encoded with the delivery profile
+        self.intermediate_format = "x264-lossless"
+        self.keep_mezzanine = False  # Keep the untitled grid so it can be re-titled cheaply
+        self.retitle = False  # Only redo the title from a kept mezzanine
+
+        # Number of concurrent ffprobe processes
+        self.probe_workers = DEFAULT_PROBE_WORKERS
+        self.probe_cache = None  # Optional ProbeCache shared across runs
+        self.proxy_cache = None  # Optional ProxyCache of pre-scaled cells
+
+        # Dry run: record the ffmpeg commands in self.plan instead of running them
+        self.plan_only = False
+        self.plan = None
+
+        # Optional RunMetrics collecting per-stage timings and ffmpeg -progress stats
+        self.metrics = None
+
+        # Optional callback receiving a video_progress.ProgressEvent for every ffmpeg
+        # progress update; output_duration is the expected grid duration, for percentages/ETA
+        self.on_progress = None
+        self.output_duration = None
+
         # Verbosity
         self.verbose = os.environ.get('FFMPEG_VERBOSE', 'false').lower() == 'true'
 
     def get_video_metadata(self, video_path):
-        """Get duration, framerate, and dimensions of a video using ffprobe."""
+        """Get duration, framerate, and dimensions of a video using a single ffprobe call."""
         try:
-            # Get duration
-            duration_cmd = [
-                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            duration = float(subprocess.check_output(duration_cmd).decode().strip())
-
-            # Get framerate
-            fps_cmd = [
-                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=r_frame_rate',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            fps_str = subprocess.check_output(fps_cmd).decode().strip()
-            # Convert fraction to decimal
-            if '/' in fps_str:
-                num, den = map(float, fps_str.split('/'))
-                fps = num / den
-            else:
-                fps = float(fps_str)
-
-            # Get width
-            width_cmd = [
-                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=width',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            width = int(subprocess.check_output(width_cmd).decode().strip())
-
-            # Get height
-            height_cmd = [
-                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=height',
-                '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-            ]
-            height = int(subprocess.check_output(height_cmd).decode().strip())
-
-            return {
-                'duration': duration,
-                'fps': fps,
-                'width': width,
-                'height': height
-            }
+            with timed(self.metrics, 'probe'):
+                return probe_video(video_path, cache=self.probe_cache)
         except Exception as e:
             print(f"Error getting metadata for {video_path}: {e}", file=sys.stderr)
             return None
 
+    def get_videos_metadata(self, videos):
+        """
+        Probe all videos concurrently (except those in probed_metadata).
+        Returns None if any video fails.
+        """
+        known = self.probed_metadata or {}
+        missing = [video for video in videos if video not in known]
+        with timed(self.metrics, 'probe'):
+            probed = dict(zip(missing, probe_videos(missing, max_workers=self.probe_workers,
+                                                    cache=self.probe_cache)))
+        metadata_list = [known.get(video) or probed[video] for video in videos]
+        if any(metadata is None for metadata in metadata_list):
+            return None
+        return metadata_list
+
     def filter_videos(self, videos):
         """Filter videos by include/exclude patterns."""
         if not videos:
@@ -135,17 +208,63 @@ class VideoGridMaker:
 
         return filtered
 
-    def find_videos(self):
-        """Find all MP4 files in current directory and extract video numbers."""
-        videos = sorted(glob.glob("*.mp4"))
+    def list_videos(self):
+        """List the input MP4 files of the working directory, after pattern filtering."""
+        search_dir = self.working_dir or "."
+        if self.scanned_files is not None:
+            videos = sorted(self.scanned_files)
+        else:
+            videos = sorted(glob.glob(os.path.join(glob.escape(search_dir), "*.mp4")))
+        if not self.working_dir:
+            # Keep bare filenames when searching the current directory
+            videos = [os.path.basename(v) for v in videos]
+
+        # Never use previously generated grids, or this grid's own outputs, as inputs
+        output_paths, output_suffixes = self.own_outputs()
+        videos = [v for v in videos
+                  if not v.endswith(output_suffixes) and os.path.abspath(v) not in output_paths]
 
         # Apply pattern filtering
-        videos = self.filter_videos(videos)
+        return self.filter_videos(videos)
 
+    def own_outputs(self):
+        """
+        Return (paths, suffixes) of the files this grid writes: the absolute paths of outputs
+        with a fixed name, and the name endings of outputs named after the inputs (whose
+        common name isn't known until the inputs are), GRID_SUFFIX included.
+        """
+        placeholder = "\0"  # Stands for the common name
+        output_file = self.resolve_output_file(placeholder)
+        paths, suffixes = set(), [GRID_SUFFIX]
+        if self.output_file:
+            paths.add(os.path.abspath(output_file))
+        for spec in self.extra_outputs:
+            try:
+                path = parse_output_target(spec).resolved(output_file).path
+            except ValueError:
+                continue  # Reported by make_grid
+            if placeholder in path:
+                suffixes.append(path.split(placeholder, 1)[1])
+            else:
+                paths.add(os.path.abspath(path))
+        return paths, tuple(suffixes)
+
+    def find_videos(self):
+        """Find all MP4 files in the working directory and extract video numbers."""
+        videos = self.list_videos()
         if not videos:
             print("No MP4 files found.")
             return None, None, None
 
+        video_numbers, common_name = self.label_videos(videos)
+        return videos, video_numbers, common_name
+
+    @staticmethod
+    def label_videos(videos, warn=True):
+        """
+        Return (video numbers, common name) of videos named <name>_<number>.mp4; other names
+        are labelled with their stem. With warn, mixed names are reported.
+        """
         common_name = ""
         video_numbers = []
 
@@ -153,14 +272,14 @@ class VideoGridMaker:
         pattern = re.compile(r'^(.+)_(\d+)\.mp4$')
 
         for video in videos:
-            match = pattern.match(video)
+            match = pattern.match(os.path.basename(video))
             if match:
                 base_name = match.group(1)
                 num = match.group(2)
 
                 if not common_name:
                     common_name = base_name
-                elif common_name != base_name:
+                elif common_name != base_name and warn:
                     print(f"Warning: Mixed video name patterns detected ('{common_name}' vs '{base_name}')")
 
                 video_numbers.append(num)
@@ -168,16 +287,26 @@ class VideoGridMaker:
                 # Fallback: use filename without extension
                 video_numbers.append(Path(video).stem)
 
-        return videos, video_numbers, common_name
+        return video_numbers, common_name
+
+    @staticmethod
+    def build_normalize_filter(fps, cell_width, cell_height, padding):
+        """Filters that bring a source to the cell's frame rate, width and padding."""
+        return (f"fps={fps},scale={cell_width}:-1,"
+                f"pad={cell_width}:{cell_height}:0:{padding}:black")
 
     def build_filter_chain(self, videos, video_numbers, metadata_list, max_duration,
-                          cell_width, cell_height, padding):
-        """Build the ffmpeg filter_complex chain."""
+                          cell_width, cell_height, padding, normalized=False):
+        """
+        Build the ffmpeg filter_complex chain.
+        With normalized, the inputs are proxies that are already scaled, padded and at the
+        source frame rate, so only trimming, freezing and labels are applied.
+        """
         filters = []
 
         for i, (video, label, metadata) in enumerate(zip(videos, video_numbers, metadata_list)):
-            duration = metadata['duration']
-            fps = metadata['fps']
+            duration = metadata.duration
+            fps = metadata.fps
 
             # Calculate how much to pad (freeze last frame)
             pad_duration = max_duration - duration
@@ -213,13 +342,17 @@ class VideoGridMaker:
                     f"fontcolor={self.label_color}:fontsize={self.label_size}{box_params}"
                 )
 
+            # Scale and add black bars, unless the input is a normalized proxy
+            source = f"[{i}:v]"
+            if not normalized:
+                source += self.build_normalize_filter(fps, cell_width, cell_height, padding) + ","
+
             # Build filter chain: scale, add black bars, trim frames, freeze, add text
             if pad_duration > 0.01:
                 # Trim off last N-1 frames, then freeze on Nth-to-last frame
                 freeze_duration = pad_duration + trim_duration
                 filter_chain = (
-                    f"[{i}:v]fps={fps},scale={cell_width}:-1,"
-                    f"pad={cell_width}:{cell_height}:0:{padding}:black,"
+                    f"{source}"
                     f"trim=0:{trim_end:.6f},setpts=PTS-STARTPTS,"
                     f"tpad=stop_mode=clone:stop_duration={freeze_duration:.3f},"
                     f"setpts=PTS-STARTPTS{drawtext_filter}[v{i}]"
@@ -227,8 +360,7 @@ class VideoGridMaker:
             else:
                 # Just trim off last N-1 frames and freeze on Nth-to-last frame
                 filter_chain = (
-                    f"[{i}:v]fps={fps},scale={cell_width}:-1,"
-                    f"pad={cell_width}:{cell_height}:0:{padding}:black,"
+                    f"{source}"
                     f"trim=0:{trim_end:.6f},setpts=PTS-STARTPTS,"
                     f"tpad=stop_mode=clone:stop_duration={trim_duration:.6f},"
                     f"setpts=PTS-STARTPTS{drawtext_filter}[v{i}]"
@@ -252,16 +384,22 @@ class VideoGridMaker:
 
         return "|".join(layout_parts)
 
-    def make_grid(self):
-        """Main function to create the video grid."""
+    def resolve_inputs(self):
+        """
+        Resolve the input videos, their labels and the grid title.
+        Returns (videos, video_numbers, common_name), or None on error.
+        """
         # Use user-provided videos and captions, or auto-detect
         if self.user_videos:
             videos = self.user_videos
+            if self.working_dir:
+                # Relative paths are relative to the working directory
+                videos = [os.path.join(self.working_dir, v) for v in videos]
             # Validate that all video files exist
             for video in videos:
                 if not os.path.exists(video):
                     print(f"Error: Video file not found: {video}", file=sys.stderr)
-                    return 1
+                    return None
 
             # Apply pattern filtering to user-provided videos
             original_count = len(videos)
@@ -271,7 +409,7 @@ class VideoGridMaker:
 
             if not videos:
                 print("No videos remaining after filtering.")
-                return 1
+                return None
 
             # Use user captions, or fallback to filenames
             if self.user_captions:
@@ -283,7 +421,7 @@ class VideoGridMaker:
                 elif len(self.user_captions) != len(videos):
                     print(f"Error: Number of captions ({len(self.user_captions)}) "
                           f"must match number of videos ({len(videos)})", file=sys.stderr)
-                    return 1
+                    return None
                 else:
                     video_numbers = self.user_captions
             else:
@@ -297,29 +435,183 @@ class VideoGridMaker:
             # Auto-detect videos
             videos, video_numbers, common_name = self.find_videos()
             if videos is None:
-                return 1
+                return None
             print(f"Found {len(videos)} videos")
 
+        return videos, video_numbers, common_name
+
+    def resolve_output_file(self, common_name):
+        """Return the output path for a grid with the given title."""
+        output_file = self.output_file or f"{common_name or 'output'}{GRID_SUFFIX}"
+        if self.working_dir and not os.path.isabs(output_file):
+            output_file = os.path.join(self.working_dir, output_file)
+        return output_file
+
+    def compute_fingerprint(self, videos, video_numbers, common_name, option_names=None):
+        """
+        Fingerprint the inputs (paths, sizes, mtimes) and every option that affects the output.
+        Only stats files, so checking a directory is cheap.
+        """
+        if option_names is None:
+            option_names = self.FINGERPRINT_OPTIONS
+        base_dir = self.working_dir or "."
+        inputs = []
+        scanned = self.scanned_files or {}
+        for video in videos:
+            if video in scanned:
+                size, mtime_ns = scanned[video]
+            else:
+                st = os.stat(video)
+                size, mtime_ns = st.st_size, st.st_mtime_ns
+            inputs.append([os.path.relpath(video, base_dir), size, mtime_ns])
+
+        options = {name: getattr(self, name) for name in option_names}
+        record = {
+            'inputs': inputs,
+            'labels': list(video_numbers),
+            'title': common_name,
+            'options': options,
+        }
+        digest = hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+        return digest, record
+
+    @staticmethod
+    def fingerprint_path(output_file):
+        """Return the hidden sidecar file that stores the fingerprint of an output."""
+        directory, name = os.path.split(output_file)
+        return os.path.join(directory, f".{name}.fingerprint.json")
+
+    def cells_fingerprint(self, videos, video_numbers):
+        """Fingerprint of the composited cells only (excludes the title and final encode)."""
+        option_names = [o for o in self.FINGERPRINT_OPTIONS if o not in self.TITLE_OPTIONS]
+        return self.compute_fingerprint(videos, video_numbers, None, option_names)[0]
+
+    @staticmethod
+    def mezzanine_path(output_file):
+        """Return the hidden untitled, losslessly stored grid kept next to an output."""
+        directory, name = os.path.split(output_file)
+        return os.path.join(directory, f".{Path(name).stem}.mezzanine.mkv")
+
+    @classmethod
+    def recorded_fingerprint(cls, output_file):
+        """Return the fingerprint recorded next to output_file, or None if there is none."""
+        try:
+            with open(cls.fingerprint_path(output_file)) as f:
+                return json.load(f).get('fingerprint')
+        except (OSError, ValueError):
+            return None
+
+    def is_up_to_date(self, output_file, fingerprint, targets=()):
+        """
+        Check whether output_file exists and was built from the same fingerprint, and the
+        extra output targets rendered with it exist too.
+        """
+        if not all(os.path.exists(path) for path in [output_file] + [t.path for t in targets]):
+            return False
+        return self.recorded_fingerprint(output_file) == fingerprint
+
+    def current_fingerprint(self):
+        """
+        Return (output file, fingerprint, output targets) for the auto-detected inputs of
+        working_dir, from file stats only: nothing is probed or printed. Returns None if the
+        inputs can't be resolved that way (explicit videos, no videos, invalid settings).
+        Lets callers, such as the recursive driver's probe stage, skip up-to-date grids early.
+        """
+        if self.user_videos:
+            return None
+        try:
+            videos = self.list_videos()
+            if not videos:
+                return None
+            video_numbers, common_name = self.label_videos(videos, warn=False)
+            output_file = self.resolve_output_file(common_name)
+            targets = [parse_output_target(spec).resolved(output_file)
+                       for spec in self.extra_outputs]
+            fingerprint, _ = self.compute_fingerprint(videos, video_numbers, common_name)
+        except (OSError, ValueError):
+            return None
+        return output_file, fingerprint, targets
+
+    def make_grid(self):
+        """Main function to create the video grid."""
+        self.skipped_fresh = False
+        self.output_path = self.output_fingerprint = None
+        self.process_group = ProcessGroup()
+
+        # Validate the encode settings before doing any work
+        try:
+            profile = get_profile(self.encode_profile)
+            encode_args = x264_args(profile, self.target_bitrate, self.ffmpeg_threads(),
+                                    self.lookahead)
+            intermediate_args(self.intermediate_format)
+            targets = [parse_output_target(spec) for spec in self.extra_outputs]
+            if self.max_decoders == 1:
+                raise ValueError("--max-decoders must be 0 (off) or at least 2, "
+                                 "since stacking tiles takes two inputs")
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+        inputs = self.resolve_inputs()
+        if inputs is None:
+            return 1
+        videos, video_numbers, common_name = inputs
+
+        output_file = self.resolve_output_file(common_name)
+        self.output_path = output_file
+        self.output_targets = [target.resolved(output_file) for target in targets]
+
+        self.plan = None
+        if self.plan_only:
+            self.plan = {'script': 'make_video_grid.py', 'output': output_file,
+                         'up_to_date': False, 'commands': []}
+
+        # Skip the encode if the output was built from identical inputs and options
+        fingerprint = record = None
+        if self.skip_if_fresh or self.record_fingerprint:
+            fingerprint, record = self.compute_fingerprint(videos, video_numbers, common_name)
+            self.output_fingerprint = fingerprint
+            if self.skip_if_fresh and self.is_up_to_date(output_file, fingerprint,
+                                                         self.output_targets):
+                print(f"✓ Up to date, skipping: {output_file}")
+                self.skipped_fresh = True
+                if self.plan is not None:
+                    self.plan['up_to_date'] = True
+                return 0
+
+            # Drop any stale fingerprint so a failed encode is never taken as fresh
+            if self.plan is None and os.path.exists(self.fingerprint_path(output_file)):
+                os.remove(self.fingerprint_path(output_file))
+
+        mezzanine_file = None
+        if self.keep_mezzanine or self.retitle:
+            mezzanine_file = self.mezzanine_path(output_file)
+            cells_fingerprint = self.cells_fingerprint(videos, video_numbers)
+
+        if self.retitle:
+            if self.mezzanine_matches(mezzanine_file, cells_fingerprint):
+                print(f"Re-titling from mezzanine: {mezzanine_file}")
+                returncode = self.encode_from_mezzanine(mezzanine_file, common_name, output_file,
+                                                        profile, encode_args)
+                return self.finish_grid(returncode, output_file, fingerprint, record)
+            print("Mezzanine missing or out of date, rebuilding the whole grid")
+
         n = len(videos)
 
         # Get metadata for all videos
         print("Detecting video durations and framerates...")
-        metadata_list = []
-        max_duration = 0
-
-        for video in videos:
-            metadata = self.get_video_metadata(video)
-            if metadata is None:
-                return 1
-            metadata_list.append(metadata)
-            max_duration = max(max_duration, metadata['duration'])
+        metadata_list = self.get_videos_metadata(videos)
+        if metadata_list is None:
+            return 1
+        max_duration = max(metadata.duration for metadata in metadata_list)
+        self.output_duration = max_duration
 
         print(f"Longest video duration: {max_duration}s")
 
         # Get dimensions from first video
         print("Detecting video dimensions...")
-        orig_width = metadata_list[0]['width']
-        orig_height = metadata_list[0]['height']
+        orig_width = metadata_list[0].width
+        orig_height = metadata_list[0].height
         print(f"Original video size: {orig_width}x{orig_height}")
 
         # Calculate cell dimensions
@@ -340,90 +632,655 @@ class VideoGridMaker:
             cols = math.ceil(math.sqrt(n))
             rows = math.ceil(n / cols)
 
-        # Build filter chain
-        filters = self.build_filter_chain(
-            videos, video_numbers, metadata_list, max_duration,
-            cell_width, cell_height, padding
-        )
-
-        # Gather label references
-        refs = "".join([f"[v{i}]" for i in range(n)])
-
-        # Build xstack layout
-        layout = self.build_xstack_layout(n, rows, cols, cell_width, cell_height)
-
         # Calculate grid dimensions
         grid_width = cols * cell_width
         grid_height = rows * cell_height
 
-        # Add xstack and optional title
+        if self.plan is not None:
+            self.plan.update(self.plan_estimates(
+                metadata_list, max_duration, cell_width, scaled_height, cell_height, padding,
+                rows, cols, grid_width, grid_height, common_name
+            ))
+
+        print(f"\nCreating grid video: {output_file}")
+        print(f"Processing {len(videos)} input videos")
+        print(f"Encode profile: {profile.name} ({profile.description})")
+        for target in self.output_targets:
+            print(f"Also rendering {target.kind} in the same pass: {target.path}")
+        print(f"Resources: {get_governor().describe()}"
+              + (f", budget {self.cpu_budget} CPUs" if self.cpu_budget else ""))
+
+        if mezzanine_file:
+            print(f"Keeping untitled mezzanine ({self.intermediate_format}): {mezzanine_file}")
+
+        try:
+            # Decode from cached cell-sized proxies instead of the full-resolution sources
+            sources = videos
+            if self.proxy_cache:
+                sources = self.prepare_proxies(videos, metadata_list,
+                                               cell_width, cell_height, padding)
+                if sources is None:
+                    return 1
+            normalized = sources is not videos
+
+            if self.max_decoders and n > self.max_decoders:
+                returncode = self.make_tiled_grid(
+                    sources, video_numbers, metadata_list, max_duration,
+                    cell_width, cell_height, padding, rows, cols,
+                    common_name, grid_width, grid_height, profile, encode_args, output_file,
+                    mezzanine_file, normalized
+                )
+            else:
+                with timed(self.metrics, 'filtergraph'):
+                    # Build filter chain
+                    filters = self.build_filter_chain(
+                        sources, video_numbers, metadata_list, max_duration,
+                        cell_width, cell_height, padding, normalized
+                    )
+
+                    # Stack every cell and add the optional title
+                    layout = self.build_xstack_layout(n, rows, cols, cell_width, cell_height)
+                    filters += "; " + self.build_stack_filter(n, layout)
+
+                    if mezzanine_file:
+                        # Composite once into the mezzanine, then title and encode from it
+                        ffmpeg_cmd = self.build_ffmpeg_command(
+                            sources, filters, '[outv]',
+                            intermediate_args(self.intermediate_format, self.ffmpeg_threads())
+                        )
+                    else:
+                        filters += "; " + self.build_title_filter(common_name, grid_width, grid_height)
+                        ffmpeg_cmd = self.build_final_command(sources, filters, encode_args)
+                print(f"Command built with {len(ffmpeg_cmd) + 1} arguments")
+
+                if self.verbose:
+                    print(f"Command: {' '.join(ffmpeg_cmd[:15])} ...")
+
+                # Execute ffmpeg
+                print("Executing ffmpeg...")
+                if mezzanine_file:
+                    with timed(self.metrics, 'composite'):
+                        returncode = self.write_atomically(mezzanine_file, lambda path: self.run_ffmpeg(
+                            ffmpeg_cmd + [path], label=os.path.basename(mezzanine_file)
+                        ))
+                else:
+                    returncode = self.encode(ffmpeg_cmd, output_file, profile)
+
+            if returncode == 0 and mezzanine_file:
+                if self.plan is None:
+                    self.write_mezzanine_record(mezzanine_file, cells_fingerprint)
+                returncode = self.encode_from_mezzanine(mezzanine_file, common_name, output_file,
+                                                        profile, encode_args,
+                                                        (grid_width, grid_height))
+
+            return self.finish_grid(returncode, output_file, fingerprint, record)
+        except Exception as e:
+            print(f"✗ Error executing ffmpeg: {e}", file=sys.stderr)
+            return 1
+
+    def plan_estimates(self, metadata_list, max_duration, cell_width, scaled_height, cell_height,
+                       padding, rows, cols, grid_width, grid_height, common_name):
+        """
+        Describe the inputs, geometry and cost of a build for a dry-run plan.
+        Decode costs count every source frame (or cell-sized proxy frame with a proxy cache);
+        the output runs at the first input's frame rate, as xstack does.
+        """
+        if self.show_title and common_name:
+            output_width, output_height = grid_width, grid_height + self.title_padding
+        else:
+            output_width, output_height = 2 * (grid_width // 2), 2 * (grid_height // 2)
+
+        decoded_frames = 0
+        decoded_pixels = 0
+        for metadata in metadata_list:
+            frames = frame_count(metadata)
+            decoded_frames += frames
+            if self.proxy_cache:
+                decoded_pixels += frames * cell_width * cell_height
+            else:
+                decoded_pixels += frames * metadata.width * metadata.height
+
+        output_fps = metadata_list[0].fps
+        output_frames = int(math.ceil(max_duration * output_fps))
+
+        return {
+            'inputs': input_records(metadata_list),
+            'geometry': {
+                'cell_width': cell_width,
+                'scaled_height': scaled_height,
+                'padding': padding,
+                'cell_height': cell_height,
+                'rows': rows,
+                'cols': cols,
+                'grid_width': grid_width,
+                'grid_height': grid_height,
+                'output_width': output_width,
+                'output_height': output_height,
+                'tiled': bool(self.max_decoders and len(metadata_list) > self.max_decoders),
+            },
+            'estimates': {
+                'duration': max_duration,
+                'output_fps': output_fps,
+                'output_frames': output_frames,
+                'decoded_frames': decoded_frames,
+                'decoded_pixels': decoded_pixels,
+                'encoded_pixels': output_frames * output_width * output_height,
+            },
+        }
+
+    def finish_grid(self, returncode, output_file, fingerprint, record):
+        """Report the result of a build and record its fingerprint on success."""
+        if self.plan is not None:
+            print(f"✓ Planned {len(self.plan['commands'])} ffmpeg command(s)")
+            return returncode
+
+        if returncode == 0:
+            print("✓ Grid video created successfully")
+            for target in self.output_targets:
+                print(f"✓ Also created {target.kind}: {target.path}")
+            if self.record_fingerprint:
+                with open(self.fingerprint_path(output_file), 'w') as f:
+                    json.dump({'fingerprint': fingerprint, **record}, f, indent=2)
+            return 0
+        else:
+            print(f"✗ ffmpeg exited with code {returncode}")
+            return returncode
+
+    def write_mezzanine_record(self, mezzanine_file, cells_fingerprint):
+        """Record which cells a mezzanine was built from."""
+        with open(mezzanine_file + ".json", 'w') as f:
+            json.dump({'cells_fingerprint': cells_fingerprint}, f)
+
+    def mezzanine_matches(self, mezzanine_file, cells_fingerprint):
+        """Check that a kept mezzanine exists and was built from the current cells."""
+        if not os.path.exists(mezzanine_file):
+            return False
+        try:
+            with open(mezzanine_file + ".json") as f:
+                return json.load(f).get('cells_fingerprint') == cells_fingerprint
+        except (OSError, ValueError):
+            return False
+
+    def encode_from_mezzanine(self, mezzanine_file, common_name, output_file, profile, encode_args,
+                              grid_size=None):
+        """
+        Final stage of a multi-stage build: add the title to the untitled mezzanine grid and
+        encode it with the delivery profile. Only the mezzanine is decoded, not the cells.
+        grid_size is the mezzanine's (width, height) if known, otherwise it is probed.
+        """
+        if grid_size is None:
+            metadata = self.get_video_metadata(mezzanine_file)
+            if metadata is None:
+                return 1
+            grid_size = (metadata.width, metadata.height)
+            self.output_duration = metadata.duration
+
+        filters = "[0:v]null[outv]; " + self.build_title_filter(common_name, *grid_size)
+        ffmpeg_cmd = self.build_final_command([mezzanine_file], filters, encode_args)
+        print("Encoding final grid from mezzanine...")
+        return self.encode(ffmpeg_cmd, output_file, profile)
+
+    def build_stack_filter(self, n, layout):
+        """Stack the labelled cell streams [v0], [v1], ... into [outv]."""
+        refs = "".join([f"[v{i}]" for i in range(n)])
+        if n == 1:
+            # xstack needs at least two inputs
+            return f"{refs}null[outv]"
+        return f"{refs}xstack=layout={layout}:inputs={n}[outv]"
+
+    def build_title_filter(self, common_name, grid_width, grid_height):
+        """Round [outv] to even dimensions and add the optional title bar, producing [final]."""
         if self.show_title and common_name:
             padded_height = grid_height + self.title_padding
             # Escape single quotes in common_name
             common_name_escaped = common_name.replace("'", r"'\''")
-            filters += (
-                f"; {refs}xstack=layout={layout}:inputs={n}[outv];"
+            return (
                 f"[outv]scale='2*trunc(iw/2)':'2*trunc(ih/2)'[scaled];"
                 f"[scaled]pad={grid_width}:{padded_height}:0:{self.title_padding}:black[padded];"
                 f"[padded]drawtext=text='{common_name_escaped}':x=(w-tw)/2:"
                 f"y=({self.title_padding}-th)/2:font=Arial:fontcolor=white:fontsize=36:"
                 f"box=1:boxcolor=black@0.7[final]"
             )
-        else:
-            filters += (
-                f"; {refs}xstack=layout={layout}:inputs={n}[outv];"
-                f"[outv]scale='2*trunc(iw/2)':'2*trunc(ih/2)'[final]"
-            )
+        return "[outv]scale='2*trunc(iw/2)':'2*trunc(ih/2)'[final]"
 
-        # Determine output filename
-        if not self.output_file:
-            self.output_file = f"{common_name or 'output'}_GRID.mp4"
-
-        # Build ffmpeg command
+    def build_ffmpeg_command(self, inputs, filters, map_label, output_args, concurrent=1):
+        """
+        Build an ffmpeg command (without the output path) for a filter_complex graph,
+        to run alongside concurrent - 1 others (see ffmpeg_threads).
+        """
         loglevel = "info" if self.verbose else "error"
 
         ffmpeg_cmd = ['ffmpeg', '-loglevel', loglevel, '-y', '-vsync', 'cfr']
+        threads = self.ffmpeg_threads(concurrent)
+        if threads:
+            ffmpeg_cmd.extend(['-filter_complex_threads', str(threads)])
 
         # Add input files
-        for video in videos:
+        for video in inputs:
             ffmpeg_cmd.extend(['-i', video])
 
         # Add filter and output options
         ffmpeg_cmd.extend([
             '-filter_complex', filters,
-            '-map', '[final]',
-            '-c:v', 'libx264',
-            '-crf', '23',
-            '-pix_fmt', 'yuv420p',
-            self.output_file
+            '-map', map_label,
         ])
+        ffmpeg_cmd.extend(output_args)
+        return ffmpeg_cmd
 
-        print(f"\nCreating grid video: {self.output_file}")
-        print(f"Processing {len(videos)} input videos")
-        print(f"Command built with {len(ffmpeg_cmd)} arguments")
+    def build_final_command(self, inputs, filters, encode_args):
+        """
+        Build the final stage's command (without output paths) from a graph ending in [final].
+        With extra outputs, [final] is split into the grid's stream and one branch per
+        output (see video_outputs.py), so that everything is rendered from one decode;
+        extra_output_args then adds the extra outputs after the grid's path.
+        """
+        if self.output_targets:
+            profile = get_profile(self.encode_profile)
+            n = len(self.output_targets)
+            filters += f"; [final]split={n + 1}[grid]" + "".join(f"[extra{i}]" for i in range(n))
+            for i, target in enumerate(self.output_targets):
+                filters += "; " + target.build_filter(f"extra{i}", f"out{i}", profile,
+                                                      self.output_duration)
+            return self.build_ffmpeg_command(inputs, filters, '[grid]', encode_args)
+        return self.build_ffmpeg_command(inputs, filters, '[final]', encode_args)
+
+    def extra_output_args(self, paths=None):
+        """
+        ffmpeg arguments writing the extra outputs to paths (one per output target), to follow
+        the grid's output path. Without paths, they are decoded into the null muxer instead.
+        """
+        args = []
+        for i, target in enumerate(self.output_targets):
+            args.extend(['-map', f'[out{i}]'])
+            if paths is None:
+                args.extend(['-f', 'null', os.devnull])
+            else:
+                args.extend(target.output_args(self.ffmpeg_threads()) + [paths[i]])
+        return args
+
+    def encode(self, ffmpeg_cmd, output_file, profile):
+        """
+        Run the final encode, in two passes if the profile requires it.
+        Extra outputs are written by the same ffmpeg run (the second pass of two).
+        """
+        extra_files = [target.path for target in self.output_targets]
+        with timed(self.metrics, 'encode'):
+            if profile.two_pass:
+                return self.write_atomically(
+                    output_file, lambda path, *extras: self.run_two_pass(ffmpeg_cmd, path, extras),
+                    extra_files
+                )
+            return self.write_atomically(output_file, lambda path, *extras: self.run_ffmpeg(
+                ffmpeg_cmd + [path] + self.extra_output_args(extras),
+                label=os.path.basename(output_file)
+            ), extra_files)
 
-        if self.verbose:
-            print(f"Command: {' '.join(ffmpeg_cmd[:15])} ...")
+    @staticmethod
+    def partial_path(output_file):
+        """
+        Create an empty hidden temporary file, unique to this writer, that an output is
+        written under until it is complete, and return its path. Like a directly written
+        output, it gets the permissions the umask allows.
+        """
+        directory, name = os.path.split(output_file)
+        stem, ext = os.path.splitext(name)
+        while True:
+            temp_path = os.path.join(directory, f".{stem.lstrip('.')}.{secrets.token_hex(4)}"
+                                                f".partial{ext}")
+            try:
+                os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+                return temp_path
+            except FileExistsError:
+                continue  # Taken by another writer; draw another name
+
+    def write_atomically(self, output_file, write, extra_files=()):
+        """
+        Produce output_file (and any extra_files written by the same run) by calling
+        write(path, *extra_paths) with temporary paths in the same directories, and rename
+        the results into place only if write returns 0. A failed or interrupted build never
+        leaves a complete-looking (but truncated) output behind.
+        Returns write's exit code. In plan mode, write gets the final paths themselves.
+        """
+        if self.plan is not None:
+            return write(output_file, *extra_files)
 
-        # Execute ffmpeg
-        print("Executing ffmpeg...")
+        files = [output_file, *extra_files]
+        temp_files = []
         try:
-            result = subprocess.run(ffmpeg_cmd, check=False)
+            for file in files:
+                temp_files.append(self.partial_path(file))
+            returncode = write(*temp_files)
+            if returncode == 0:
+                for temp_file, file in zip(temp_files, files):
+                    os.replace(temp_file, file)
+            return returncode
+        finally:
+            for temp_file in temp_files:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+
+    @staticmethod
+    def group_shape(rows, cols, limit):
+        """
+        Return the (rows, cols) of the rectangular groups, at most limit cells each, that
+        cover a rows x cols grid with the fewest groups (the squarest on ties).
+        """
+        best = None
+        for group_cols in range(1, min(cols, limit) + 1):
+            group_rows = min(rows, limit // group_cols)
+            count = math.ceil(rows / group_rows) * math.ceil(cols / group_cols)
+            candidate = (count, abs(group_rows - group_cols), group_rows, group_cols)
+            best = candidate if best is None else min(best, candidate)
+        return best[2], best[3]
+
+    @staticmethod
+    def group_grid(cells, rows, cols, shape):
+        """
+        Split the (row, col) cells of a rows x cols grid into rectangular groups of the given
+        shape. Returns a list of (group row, group col, cells in row-major order); groups
+        without any cell (e.g. past the end of a partial last row) are left out.
+        """
+        group_rows, group_cols = shape
+        groups = []
+        for r0 in range(0, rows, group_rows):
+            for c0 in range(0, cols, group_cols):
+                members = [(r, c) for r in range(r0, min(r0 + group_rows, rows))
+                           for c in range(c0, min(c0 + group_cols, cols)) if (r, c) in cells]
+                if members:
+                    groups.append((r0 // group_rows, c0 // group_cols, members))
+        return groups
+
+    def plan_tiles(self, n, rows, cols):
+        """
+        Split the grid into rectangular tiles of at most max_decoders cells.
+        Returns (tiles, tile shape), tiles being a list of (cell indices, positions within
+        the tile, tile row/col in the grid of tiles).
+        """
+        shape = self.group_shape(rows, cols, self.max_decoders)
+        cells = {(i // cols, i % cols) for i in range(n)}
+        tiles = []
+        for tile_row, tile_col, members in self.group_grid(cells, rows, cols, shape):
+            r0, c0 = tile_row * shape[0], tile_col * shape[1]
+            tiles.append(([r * cols + c for r, c in members],
+                          [(r - r0, c - c0) for r, c in members], (tile_row, tile_col)))
+        return tiles, shape
+
+    @staticmethod
+    def build_offset_stack_filter(offsets):
+        """
+        Stack inputs 0..n-1 placed at pixel offsets [(x, y), ...] into [outv]; the output
+        starts at the smallest offsets.
+        """
+        if len(offsets) == 1:
+            return "[0:v]null[outv]"
+        x0 = min(x for x, _ in offsets)
+        y0 = min(y for _, y in offsets)
+        refs = "".join(f"[{k}:v]" for k in range(len(offsets)))
+        layout = "|".join(f"{x - x0}_{y - y0}" for x, y in offsets)
+        return f"{refs}xstack=layout={layout}:inputs={len(offsets)}[outv]"
+
+    def make_tiled_grid(self, videos, video_numbers, metadata_list, max_duration,
+                        cell_width, cell_height, padding, rows, cols,
+                        common_name, grid_width, grid_height, profile, encode_args, output_file,
+                        mezzanine_file=None, normalized=False):
+        """
+        Build the grid hierarchically: encode sub-grids (tiles) of at most max_decoders
+        inputs each as intermediate files, in parallel, then stack the tiles in groups of at
+        most max_decoders, level by level, until one pass can stack the rest.
+        This caps the number of decoders (and memory) per ffmpeg process.
+        With mezzanine_file, the stacked tiles are written there untitled instead.
+        With normalized, videos are cell-sized proxies (see build_filter_chain).
+        """
+        tiles, shape = self.plan_tiles(len(videos), rows, cols)
+        tile_jobs = max(1, min(self.tile_jobs, len(tiles)))
+        tile_threads = self.ffmpeg_threads(tile_jobs)
+        print(f"Tiled mode: {len(tiles)} tiles of up to {shape[0]}x{shape[1]} videos, "
+              f"{tile_jobs} at a time" + (f" with {tile_threads} threads each" if tile_threads else ""))
+
+        output_dir = os.path.dirname(output_file) or "."
+        if self.plan is not None:
+            # Plans only record the commands: name the tile directory without creating it
+            tiles_dir = contextlib.nullcontext(os.path.join(output_dir, ".grid_tiles_XXXXXXXX"))
+        else:
+            tiles_dir = tempfile.TemporaryDirectory(dir=output_dir, prefix=".grid_tiles_")
+        with tiles_dir as temp_dir:
+
+            def encode_tile(k):
+                indices, positions, _ = tiles[k]
+                tile_filters = self.build_filter_chain(
+                    [videos[i] for i in indices], [video_numbers[i] for i in indices],
+                    [metadata_list[i] for i in indices], max_duration,
+                    cell_width, cell_height, padding, normalized
+                )
+                layout = "|".join(f"{c * cell_width}_{r * cell_height}" for r, c in positions)
+                tile_filters += "; " + self.build_stack_filter(len(indices), layout)
 
-            if result.returncode == 0:
-                print("✓ Grid video created successfully")
-                return 0
-            else:
-                print(f"✗ ffmpeg exited with code {result.returncode}")
-                return result.returncode
-        except Exception as e:
-            print(f"✗ Error executing ffmpeg: {e}", file=sys.stderr)
-            return 1
+                tile_path = os.path.join(temp_dir, f"tile_{k:03d}.mkv")
+                ffmpeg_cmd = self.build_ffmpeg_command(
+                    [videos[i] for i in indices], tile_filters, '[outv]',
+                    intermediate_args(self.intermediate_format, tile_threads), tile_jobs
+                )
+                returncode = self.run_ffmpeg(ffmpeg_cmd + [tile_path],
+                                             label=f"tile {k + 1}/{len(tiles)}")
+                return returncode, tile_path
+
+            def encode_parts(encode_part, count, what):
+                """Run encode_part(k) for k < count, tile_jobs at a time; return the paths."""
+                paths = [None] * count
+                with ThreadPoolExecutor(max_workers=tile_jobs) as executor:
+                    futures = {executor.submit(encode_part, k): k for k in range(count)}
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        k = futures[future]
+                        returncode, path = future.result()
+                        if returncode != 0:
+                            print(f"✗ {what.capitalize()} {k + 1}/{count} failed")
+                            # Drop queued encodes and stop the running ones rather than
+                            # waiting minutes for them to finish
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            get_engine().cancel_group(self.process_group)
+                            executor.shutdown(wait=True)
+                            return None, returncode
+                        paths[k] = path
+                        print(f"  [{done}/{count}] {what.capitalize()} encoded")
+                return paths, 0
+
+            # Encode the tiles in parallel
+            print(f"Tile format: {self.intermediate_format}")
+            with timed(self.metrics, 'tiles'):
+                tile_paths, returncode = encode_parts(encode_tile, len(tiles), 'tile')
+            if tile_paths is None:
+                return returncode
+
+            # Parts still to stack, by position in the grid of parts: (path, pixel x, y)
+            parts = {
+                position: (path, position[1] * shape[1] * cell_width,
+                           position[0] * shape[0] * cell_height)
+                for (_, _, position), path in zip(tiles, tile_paths)
+            }
+            part_rows, part_cols = math.ceil(rows / shape[0]), math.ceil(cols / shape[1])
+
+            # Stack the parts in groups until a single pass can stack the rest
+            level = 0
+            while len(parts) > self.max_decoders:
+                level += 1
+                group_shape = self.group_shape(part_rows, part_cols, self.max_decoders)
+                groups = self.group_grid(parts, part_rows, part_cols, group_shape)
+                print(f"Stacking level {level}: {len(parts)} parts into {len(groups)} groups")
+
+                def encode_group(k):
+                    members = [parts[position] for position in groups[k][2]]
+                    if len(members) == 1:
+                        return 0, members[0][0]  # Nothing to stack
+                    group_path = os.path.join(temp_dir, f"level{level}_{k:03d}.mkv")
+                    ffmpeg_cmd = self.build_ffmpeg_command(
+                        [path for path, _, _ in members],
+                        self.build_offset_stack_filter([(x, y) for _, x, y in members]),
+                        '[outv]', intermediate_args(self.intermediate_format, tile_threads),
+                        tile_jobs
+                    )
+                    returncode = self.run_ffmpeg(ffmpeg_cmd + [group_path],
+                                                 label=f"level {level} group {k + 1}/{len(groups)}")
+                    return returncode, group_path
+
+                with timed(self.metrics, 'tiles'):
+                    group_paths, returncode = encode_parts(encode_group, len(groups), 'group')
+                if group_paths is None:
+                    return returncode
+                parts = {
+                    (group_row, group_col): (
+                        path,
+                        min(parts[position][1] for position in members),
+                        min(parts[position][2] for position in members),
+                    )
+                    for (group_row, group_col, members), path in zip(groups, group_paths)
+                }
+                part_rows = math.ceil(part_rows / group_shape[0])
+                part_cols = math.ceil(part_cols / group_shape[1])
+
+            # Stack the remaining parts at their offsets
+            stacked = [parts[position] for position in sorted(parts)]
+            stacked_paths = [path for path, _, _ in stacked]
+            filters = self.build_offset_stack_filter([(x, y) for _, x, y in stacked])
+
+            print("Stacking tiles...")
+            if mezzanine_file:
+                ffmpeg_cmd = self.build_ffmpeg_command(
+                    stacked_paths, filters, '[outv]',
+                    intermediate_args(self.intermediate_format, self.ffmpeg_threads())
+                )
+                with timed(self.metrics, 'composite'):
+                    return self.write_atomically(mezzanine_file, lambda path: self.run_ffmpeg(
+                        ffmpeg_cmd + [path], label=os.path.basename(mezzanine_file)
+                    ))
 
+            filters += "; " + self.build_title_filter(common_name, grid_width, grid_height)
+            ffmpeg_cmd = self.build_final_command(stacked_paths, filters, encode_args)
+            return self.encode(ffmpeg_cmd, output_file, profile)
 
-def main():
-    """Parse arguments and create video grid."""
+    def prepare_proxies(self, videos, metadata_list, cell_width, cell_height, padding):
+        """
+        Return a proxy path for every video: the source at its own frame rate, scaled and
+        padded to the cell, in the intermediate format. Missing proxies are encoded in
+        parallel (tile_jobs at a time) and stored in proxy_cache, so later runs that only
+        change labels, title or encoding decode small proxies instead of the sources.
+        Returns None if a proxy could not be encoded.
+        """
+        # Thread counts don't change the decoded proxy, so they are left out of the cache key
+        key_args = ['-an'] + intermediate_args(self.intermediate_format)
+        proxies = [None] * len(videos)
+        missing = []
+        for i, (video, metadata) in enumerate(zip(videos, metadata_list)):
+            filters = self.build_normalize_filter(metadata.fps, cell_width, cell_height, padding)
+            key = self.proxy_cache.key(video, filters, key_args)
+            proxies[i] = self.proxy_cache.get(key)
+            if proxies[i] is None:
+                missing.append((i, video, filters, key, metadata.duration))
+
+        if not missing:
+            print(f"Using {len(videos)} cached cell proxies")
+            return proxies
+
+        proxy_jobs = max(1, min(self.tile_jobs, len(missing)))
+        proxy_threads = self.ffmpeg_threads(proxy_jobs)
+        output_args = ['-an'] + intermediate_args(self.intermediate_format, proxy_threads)
+        print(f"Encoding {len(missing)} of {len(videos)} cell proxies "
+              f"({self.intermediate_format}), {proxy_jobs} at a time"
+              + (f" with {proxy_threads} threads each" if proxy_threads else ""))
+
+        def encode_proxy(video, filters, key, duration):
+            loglevel = "info" if self.verbose else "error"
+            cmd = ['ffmpeg', '-loglevel', loglevel, '-y', '-i', video, '-vf', filters]
+            if self.plan is not None:
+                proxy_path = self.proxy_cache.path(key)
+                return self.run_ffmpeg(cmd + output_args + [proxy_path]), proxy_path
+
+            temp_path = self.proxy_cache.temp_path()
+            try:
+                returncode = self.run_ffmpeg(cmd + output_args + [temp_path], duration,
+                                             label=f"proxy {os.path.basename(video)}")
+                if returncode != 0:
+                    return returncode, None
+                return returncode, self.proxy_cache.put(key, temp_path)
+            finally:
+                # Failed, cancelled or interrupted encodes leave no temporary file behind
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        with timed(self.metrics, 'proxies'), \
+                ThreadPoolExecutor(max_workers=proxy_jobs) as executor:
+            futures = {executor.submit(encode_proxy, video, filters, key, duration): (i, video)
+                       for i, video, filters, key, duration in missing}
+            for done, future in enumerate(as_completed(futures), start=1):
+                i, video = futures[future]
+                returncode, proxy_path = future.result()
+                if returncode != 0:
+                    print(f"✗ Failed to encode proxy for {video}")
+                    # As with tiles, stop the running encodes instead of waiting for them
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    get_engine().cancel_group(self.process_group)
+                    executor.shutdown(wait=True)
+                    return None
+                proxies[i] = proxy_path
+                print(f"  [{done}/{len(missing)}] Proxy encoded: {video}")
+
+        return proxies
+
+    def ffmpeg_threads(self, concurrent=1):
+        """
+        Threads for one of `concurrent` ffmpeg runs sharing this grid's CPU budget:
+        --threads if given, else the resource governor's split (0 = ffmpeg decides).
+        """
+        if self.threads:
+            return self.threads
+        return get_governor().threads_for(concurrent, self.cpu_budget)
+
+    def run_ffmpeg(self, cmd, duration=None, label=None):
+        """
+        Run an ffmpeg command and return its exit code (in plan mode, only record it).
+        Progress is reported to on_progress against duration (default: output_duration),
+        labelled with label (default: the output file name).
+        """
+        if self.plan is not None:
+            self.plan['commands'].append(cmd)
+            return 0
+
+        result = run_ffmpeg(cmd, capture_output=self.capture_output, metrics=self.metrics,
+                            on_progress=self.on_progress,
+                            duration=duration or self.output_duration, label=label,
+                            group=self.process_group)
+        if self.capture_output:
+            print(result.stderr, end='')
+        return result.returncode
+
+    def run_two_pass(self, ffmpeg_cmd, output_file, extra_files=()):
+        """
+        Run a two-pass encode: analysis pass to the null muxer, then the real encode, which
+        also writes the extra outputs to extra_files.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            passlog = os.path.join(temp_dir, 'x264_pass')
+
+            print("  Pass 1/2 (analysis)...")
+            returncode = self.run_ffmpeg(
+                ffmpeg_cmd + ['-pass', '1', '-passlogfile', passlog, '-f', 'null', os.devnull]
+                + self.extra_output_args(),
+                label="pass 1/2"
+            )
+            if returncode != 0:
+                return returncode
+
+            print("  Pass 2/2 (encode)...")
+            return self.run_ffmpeg(
+                ffmpeg_cmd + ['-pass', '2', '-passlogfile', passlog, output_file]
+                + self.extra_output_args(extra_files),
+                label="pass 2/2"
+            )
+
+
+def build_parser():
+    """Build the command-line parser for make_video_grid.py."""
     parser = argparse.ArgumentParser(
+        prog='make_video_grid.py',
         description='Create a grid video from MP4 files matching pattern <video_name>_<number>.mp4',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
@@ -432,6 +1289,7 @@ Examples:
   python make_video_grid.py --no-title                           # Grid without title
   python make_video_grid.py --width 800 --padding 3              # Custom width and padding
   python make_video_grid.py --output my_grid.mp4                 # Custom output filename
+  python make_video_grid.py --extra-output gif --extra-output poster:time=2  # GIF and poster in one pass
   python make_video_grid.py --no-labels                          # Hide video numbers
   python make_video_grid.py --label-size 36 --label-color yellow # Bigger yellow labels
   python make_video_grid.py --label-format "Camera %s"           # Custom label format
@@ -446,11 +1304,22 @@ Examples:
   python make_video_grid.py --videos a.mp4 b.mp4 c.mp4 --captions "Run 1" "Run 2" "Run 3"
   python make_video_grid.py --videos *.mp4 --title "My Experiment"
   python make_video_grid.py --vertical                            # Stack videos in a single column
+  python make_video_grid.py --max-decoders 16                     # Build large grids from 4x4 tiles
+  python make_video_grid.py --keep-mezzanine                      # Keep a lossless untitled grid...
+  python make_video_grid.py --retitle --title-padding 120         # ...and re-title it without the cells
+  python make_video_grid.py --proxy-cache --label-size 36         # Iterate on labels from cached proxies
+  python make_video_grid.py --plan > plan.json                    # Show the ffmpeg commands without running them
+
+  # Encoding speed/quality:
+  python make_video_grid.py --profile preview                     # Fast, low-quality encode for layout checks
+  python make_video_grid.py --profile size --target-bitrate 2M    # Two-pass encode to 2 Mbit/s
 
 Expected input: MP4 files named like experiment_0.mp4, experiment_1.mp4, etc.
 Or use --videos to explicitly specify video files.
 Note: Videos that finish early and are frozen will show a checkmark (✓) next to their label.
-        """
+
+Encode profiles (--profile):
+""" + profile_help()
     )
 
     # Input options
@@ -505,10 +1374,72 @@ Note: Videos that finish early and are frozen will show a checkmark (✓) next t
     output_group = parser.add_argument_group('Output Options')
     output_group.add_argument('--output', type=str, default='',
                              help='Output filename (default: <video_name>_GRID.mp4)')
-
-    args = parser.parse_args()
-
-    # Create VideoGridMaker and set options
+    output_group.add_argument('--profile', choices=list(ENCODE_PROFILES), default='default',
+                             help='Encode profile (default: default, see below)')
+    output_group.add_argument('--target-bitrate', type=str, default=None,
+                             help='Target video bitrate for the "size" profile (e.g. 2M)')
+    output_group.add_argument('--lookahead', type=int, default=None,
+                             help='x264 rate-control lookahead in frames (default: preset default)')
+    output_group.add_argument('--extra-output', action='append', default=[], metavar='SPEC',
+                             help='Also render gif, poster or preview from the same decode; repeatable, '
+                                  'e.g. gif:fps=10:width=480, poster:time=2, preview:width=320 '
+                                  '(optional path=FILE last)')
+    output_group.add_argument('--incremental', action='store_true',
+                             help='Skip encoding if the output is up to date with its inputs and options')
+    output_group.add_argument('--max-decoders', type=int, default=0,
+                             help='Build grids with more videos than this from tiles of at most this '
+                                  'many videos, stacked at most this many at a time, to cap '
+                                  'decoders/memory per ffmpeg (default: 0 = off, else at least 2)')
+    output_group.add_argument('--tile-jobs', type=int, default=min(4, get_governor().cpus),
+                             help='Number of tiles or proxies to encode in parallel '
+                                  '(default: min(4, CPUs))')
+    output_group.add_argument('--intermediate', choices=list(INTERMEDIATE_FORMATS),
+                             default='x264-lossless',
+                             help='Format for intermediate stages such as tiles and the mezzanine '
+                                  '(default: x264-lossless)')
+    output_group.add_argument('--keep-mezzanine', action='store_true',
+                             help='Keep the untitled grid losslessly next to the output so it can be '
+                                  're-titled with --retitle without decoding the cells again')
+    output_group.add_argument('--retitle', action='store_true',
+                             help='Only redo the title/final encode from the kept mezzanine '
+                                  '(rebuilds everything if the mezzanine is missing or stale)')
+    output_group.add_argument('--proxy-cache', action='store_true',
+                             help='Composite from cached cell-sized proxies of the sources, so '
+                                  'label/title/encode changes skip decoding and scaling the originals')
+    output_group.add_argument('--plan', nargs='?', const='-', metavar='FILE',
+                             help='Only probe the inputs and print (or write to FILE) a JSON plan '
+                                  'with the ffmpeg commands, geometry and cost estimates')
+    output_group.add_argument('--metrics', metavar='FILE',
+                             help='Write per-stage timings, child CPU/RSS and ffmpeg speed as JSON')
+    output_group.add_argument('--no-progress', action='store_true',
+                             help='Hide the live encode progress line (shown when stderr is a terminal)')
+    output_group.add_argument('--threads', type=int, default=0,
+                             help='ffmpeg filter/encoder threads per run (default: 0 = split the CPU budget)')
+    output_group.add_argument('--cpu-budget', type=int, default=0,
+                             help='CPUs this grid may use, split between parallel tiles/proxies '
+                                  '(default: 0 = all available, respecting cgroup quotas)')
+
+    # Process options
+    process_group = parser.add_argument_group('Process Options')
+    process_group.add_argument('--max-processes', type=int, default=None,
+                              help=f'Maximum concurrent ffmpeg/ffprobe processes (default: {DEFAULT_MAX_PROCESSES})')
+    process_group.add_argument('--timeout', type=float, default=None,
+                              help='Stop any ffmpeg/ffprobe run that takes longer than this many seconds')
+    process_group.add_argument('--retries', type=int, default=None,
+                              help=f'Retries after transient failures, e.g. out of memory (default: {DEFAULT_RETRIES})')
+
+    # Cache options
+    cache_group = parser.add_argument_group('Cache Options')
+    cache_group.add_argument('--no-cache', action='store_true',
+                            help='Bypass the persistent ffprobe metadata cache')
+    cache_group.add_argument('--clear-cache', action='store_true',
+                            help='Clear the ffprobe metadata and proxy caches before running')
+
+    return parser
+
+
+def maker_from_args(args):
+    """Create a VideoGridMaker configured from parsed command-line arguments."""
     maker = VideoGridMaker()
     maker.user_videos = args.videos
     maker.user_captions = args.captions
@@ -529,9 +1460,77 @@ Note: Videos that finish early and are frozen will show a checkmark (✓) next t
     maker.label_box = not args.no_label_box
     maker.label_box_color = args.label_box_color
     maker.output_file = args.output
+    maker.threads = args.threads
+    maker.cpu_budget = args.cpu_budget
+    maker.max_decoders = args.max_decoders
+    maker.tile_jobs = args.tile_jobs
+    maker.intermediate_format = args.intermediate
+    maker.keep_mezzanine = args.keep_mezzanine or args.retitle
+    maker.retitle = args.retitle
+    maker.encode_profile = args.profile
+    maker.target_bitrate = args.target_bitrate
+    maker.lookahead = args.lookahead
+    maker.extra_outputs = args.extra_output
+    maker.record_fingerprint = args.incremental
+    maker.skip_if_fresh = args.incremental
+    maker.plan_only = args.plan is not None
+    if args.metrics:
+        maker.metrics = RunMetrics()
+    return maker
+
 
-    # Create the grid
-    return maker.make_grid()
+def main():
+    """Parse arguments and create video grid."""
+    args = build_parser().parse_args()
+    maker = maker_from_args(args)
+    configure_processes(max_processes=args.max_processes, timeout=args.timeout,
+                        retries=args.retries)
+
+    # Clearing applies to both caches, whether or not this run uses them
+    if args.clear_cache:
+        cache = ProbeCache()
+        cache.clear()
+        cache.close()
+        ProxyCache().clear()
+
+    if not args.no_cache:
+        maker.probe_cache = ProbeCache()
+        if args.proxy_cache:
+            maker.proxy_cache = ProxyCache()
+
+    # Show live progress (percent of the grid duration, encode fps, ETA) on a terminal
+    display = None
+    if not args.no_progress and args.plan is None and sys.stderr.isatty():
+        display = ProgressDisplay()
+        maker.on_progress = display
+
+    # With a plan on stdout, progress messages go to stderr
+    output = contextlib.nullcontext()
+    if args.plan == '-':
+        output = contextlib.redirect_stdout(sys.stderr)
+    elif display:
+        output = contextlib.redirect_stdout(display)
+
+    with output:
+        # Create the grid
+        result = maker.make_grid()
+        if display:
+            display.close()
+
+        if maker.probe_cache:
+            print(maker.probe_cache.summary())
+            maker.probe_cache.close()
+        if maker.proxy_cache:
+            print(maker.proxy_cache.summary())
+
+    if maker.plan is not None and result == 0:
+        write_plan(maker.plan, args.plan)
+
+    if maker.metrics:
+        write_report(dict(maker.metrics.report(), script='make_video_grid.py', result=result),
+                     args.metrics)
+
+    return result
 
 
 if __name__ == '__main__':
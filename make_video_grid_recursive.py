@@ -5,56 +5,189 @@ Python equivalent of the make_video_grid_recursive bash function.
 """
 
 import argparse
+import contextlib
+import dataclasses
+import io
+import multiprocessing
 import os
-import subprocess
 import sys
-from pathlib import Path
-
-
-def find_subdirectories(start_dir):
-    """Find all subdirectories recursively."""
-    subdirs = []
-    for root, dirs, files in os.walk(start_dir):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        for d in dirs:
-            subdirs.append(os.path.join(root, d))
-    return sorted(subdirs)
-
-
-def has_mp4_files(directory):
-    """Check if directory contains any MP4 files."""
-    mp4_files = list(Path(directory).glob("*.mp4"))
-    return len(mp4_files) > 0
-
-
-def process_directory(directory, grid_options):
-    """Process a single directory by calling make_video_grid.py."""
-    original_dir = os.getcwd()
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from make_video_grid import maker_from_args
+from make_video_grid import build_parser as build_grid_parser
+from video_cache import ProbeCache, ProxyCache
+from video_journal import (DEFAULT_JOURNAL_NAME, DONE, FAILED, PENDING, RUNNING, SKIPPED,
+                           open_journal)
+from video_metrics import aggregate_stages, child_usage, write_report
+from video_pipeline import stage
+from video_plan import total_estimates, write_plan
+from video_probe import DEFAULT_PROBE_WORKERS, probe_video
+from video_process import configure_processes, get_engine
+from video_progress import ProgressDisplay
+from video_queue import DEFAULT_LEASE, DEFAULT_QUEUE_NAME, WorkQueue
+from video_resources import ADMISSION_POLL, get_governor
+from video_scan import SCAN_QUEUE_SIZE, ScannedDirectory, scan_directory, scan_tree
+
+
+# process_directory result for directories whose grid was already up to date
+UP_TO_DATE = 'up-to-date'
+# Probe stage result for directories that a resumed run's journal shows as finished
+RESUMED = object()
+# Seconds between checks whether a build has been cancelled (e.g. its queue lease was lost)
+CANCEL_POLL = 1.0
+
+
+# Per-process probe cache, opened lazily (SQLite connections can't be shared across processes,
+# so a forked worker opens its own rather than using its parent's)
+_probe_cache = None
+_probe_cache_pid = None
+
+
+def get_probe_cache(grid_args):
+    """Return this process's ProbeCache, or None if caching is disabled."""
+    global _probe_cache, _probe_cache_pid
+    if grid_args.no_cache:
+        return None
+    if _probe_cache is None or _probe_cache_pid != os.getpid():
+        _probe_cache = ProbeCache()
+        _probe_cache_pid = os.getpid()
+    return _probe_cache
+
+
+def prefetcher(grid_args, cache=None, journal=None):
+    """
+    Return the probe stage of the pipeline: a function mapping a ScannedDirectory to
+    (directory, {path: VideoMetadata}) for the input videos the grid will use, probed up to
+    DEFAULT_PROBE_WORKERS at a time. Videos that fail are left out, so that the grid probes
+    them again and reports the error in its own output. Directories whose grid is up to date
+    (checked from file stats) are not probed at all. With the journal of a resumed run,
+    directories it shows as finished with their current fingerprint map to RESUMED instead.
+    """
+    selector = maker_from_args(grid_args)
+
+    def probe_or_none(video):
+        try:
+            return probe_video(video, cache=cache)
+        except Exception:
+            return None
 
+    def prefetch(directory):
+        # Explicit --videos are resolved by the grid itself
+        if not directory.videos or grid_args.videos:
+            return directory, {}
+        selector.working_dir = directory.path
+        selector.scanned_files = directory.videos
+        if grid_args.incremental or journal:
+            current = selector.current_fingerprint()
+            if current is not None and selector.is_up_to_date(*current):
+                output_file, fingerprint, _ = current
+                if journal and journal.finished(directory.path, output_file, fingerprint):
+                    return directory, RESUMED
+                # Up-to-date grids are skipped by make_grid before it probes anything
+                if grid_args.incremental:
+                    return directory, {}
+        videos = selector.list_videos()
+        if not videos:
+            return directory, {}
+
+        with ThreadPoolExecutor(max_workers=min(DEFAULT_PROBE_WORKERS, len(videos))) as executor:
+            probed = zip(videos, executor.map(probe_or_none, videos))
+            return directory, {video: metadata for video, metadata in probed if metadata}
+
+    return prefetch
+
+
+@contextlib.contextmanager
+def cancellable(cancel, maker):
+    """
+    Stop maker's ffmpeg runs (its process group) inside the block once cancel (a threading or
+    multiprocessing manager Event) is set; other runs of the process engine are not affected.
+    Cancelling repeats until the block ends, as make_grid starts a new group. With cancel
+    None, the block just runs.
+    """
+    if cancel is None:
+        yield
+        return
+    finished = threading.Event()
+
+    def watch():
+        while not finished.wait(CANCEL_POLL):
+            if cancel.is_set():
+                get_engine().cancel_group(maker.process_group)
+
+    watcher = threading.Thread(target=watch, daemon=True, name='cancel-watch')
+    watcher.start()
+    try:
+        yield
+    finally:
+        finished.set()
+        watcher.join()
+
+
+def labelled(directory, on_progress):
+    """Wrap an on_progress callback so that events carry their directory in the label."""
+    def callback(event):
+        on_progress(dataclasses.replace(event, label=f"{directory}: {event.label}"))
+    return callback
+
+
+def process_directory(directory, grid_args, capture_output=False, plans=None, reports=None,
+                      on_progress=None, videos=None, metadata=None, outcome=None, cancel=None):
+    """
+    Build the grid for a single directory in-process with VideoGridMaker.
+    grid_args is the make_video_grid.py argument namespace, parsed once by the caller.
+    Returns True (built), False (failed), None (no MP4s) or UP_TO_DATE.
+    With capture_output, ffmpeg's output is re-printed through sys.stdout
+    so that it can be buffered by the caller.
+    With --plan, nothing is encoded and the directory's plan is appended to plans.
+    With --metrics, the directory's metrics report is appended to reports.
+    on_progress receives the directory's ffmpeg progress events, labelled with the directory.
+    videos are the directory's MP4 files as found by scan_tree ({path: (size, mtime_ns)});
+    if None, the directory is scanned here. metadata ({path: VideoMetadata}) holds videos
+    already probed by the pipeline's probe stage; any others are probed by the grid.
+    outcome, if given, is a dict that receives the grid's 'output' and 'fingerprint'.
+    Setting cancel (an Event) stops the grid's ffmpeg runs, failing the directory.
+    """
     try:
-        # Change to subdirectory
-        os.chdir(directory)
-
         # Check for MP4 files
-        if not has_mp4_files('.'):
+        if videos is None:
+            _, videos = scan_directory(directory)
+        if not videos:
             print(f"Skipping (no MP4 files found): {directory}")
             return None
 
         print(f"\nProcessing directory: {directory}")
         print("---")
 
-        # Get the path to make_video_grid.py (same directory as this script)
-        script_dir = Path(__file__).parent
-        make_video_grid_script = script_dir / "make_video_grid.py"
-
-        # Build command
-        cmd = ['python3', str(make_video_grid_script)] + grid_options
-
-        # Execute make_video_grid
-        result = subprocess.run(cmd, check=False)
-
-        if result.returncode == 0:
+        maker = maker_from_args(grid_args)
+        maker.working_dir = directory
+        maker.scanned_files = videos
+        maker.probed_metadata = metadata
+        maker.record_fingerprint = True  # Also with --force, so the next run can skip
+        maker.capture_output = capture_output
+        maker.probe_cache = get_probe_cache(grid_args)
+        if on_progress is not None:
+            maker.on_progress = labelled(directory, on_progress)
+        if grid_args.proxy_cache and not grid_args.no_cache:
+            maker.proxy_cache = ProxyCache()
+
+        with cancellable(cancel, maker):
+            result = maker.make_grid()
+        if outcome is not None:
+            outcome.update(output=maker.output_path, fingerprint=maker.output_fingerprint)
+        if plans is not None and maker.plan is not None:
+            plans.append(dict(maker.plan, directory=directory))
+        if reports is not None and maker.metrics is not None:
+            reports.append(dict(maker.metrics.report(), directory=directory, result=result))
+
+        if result == 0:
+            if maker.skipped_fresh:
+                return UP_TO_DATE
+            if maker.plan is not None:
+                return True
             print(f"✓ Successfully created grid in: {directory}")
             return True
         else:
@@ -64,9 +197,34 @@ def process_directory(directory, grid_options):
     except Exception as e:
         print(f"✗ Error processing directory {directory}: {e}", file=sys.stderr)
         return False
-    finally:
-        # Always return to original directory
-        os.chdir(original_dir)
+
+
+def run_buffered_job(directory, grid_args, progress_queue=None, videos=None, metadata=None,
+                     cancel=None):
+    """
+    Worker entry point for --jobs mode.
+    Returns (result, output, cache_counts, reports, outcome) with everything the job printed
+    buffered, so logs from concurrent jobs don't interleave. Progress events are sent to progress_queue
+    as they happen, so the parent can show every job's progress live.
+    Setting cancel (a manager Event) stops the job's processes, failing the job.
+    """
+    # Workers may be spawned rather than forked, so apply the process settings here too
+    configure_processes(max_processes=grid_args.max_processes, timeout=grid_args.timeout,
+                        retries=grid_args.retries)
+    cache = get_probe_cache(grid_args)
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+
+    reports = []
+    outcome = {}
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        result = process_directory(directory, grid_args, capture_output=True, reports=reports,
+                                   on_progress=progress_queue.put if progress_queue else None,
+                                   videos=videos, metadata=metadata, outcome=outcome,
+                                   cancel=cancel)
+
+    cache_counts = (cache.hits - hits, cache.misses - misses) if cache else (0, 0)
+    return result, buffer.getvalue(), cache_counts, reports, outcome
 
 
 def main():
@@ -80,18 +238,78 @@ Examples:
   python make_video_grid_recursive.py --no-title                   # Process with no title
   python make_video_grid_recursive.py --start-dir ./experiments    # Start from specific directory
   python make_video_grid_recursive.py --width 800 --no-labels      # Custom settings for all grids
-
-All options except --start-dir are passed through to make_video_grid.py.
+  python make_video_grid_recursive.py --clear-cache                # Re-probe every video once
+  python make_video_grid_recursive.py --jobs 8                     # Build 8 directories at a time
+  python make_video_grid_recursive.py --force                      # Rebuild grids that are up to date
+  python make_video_grid_recursive.py --force --resume             # Finish an interrupted --force run
+  python make_video_grid_recursive.py --queue --jobs 4             # One of several nodes sharing a tree
+  python make_video_grid_recursive.py --plan > plan.json           # Plan every grid without encoding
+
+All options except --start-dir, --clear-cache, --jobs, --job-memory, --scan-workers, --force,
+--journal, --resume, --queue and --lease are used as make_video_grid.py options.
+Grids are rebuilt only when their input videos (paths, sizes, mtimes) or options changed;
+the fingerprint is stored in a hidden .<output>.fingerprint.json file next to each grid.
+With --jobs N, jobs are capped at the usable CPUs (cgroup quotas included) and available memory,
+each grid gets --cpu-budget <cpus/N> unless --threads is given explicitly, and a job only starts
+while --job-memory MiB are available.
+Every directory's state (pending, running, done, failed, ...) is appended to a journal
+(default: <start-dir>/.grid_journal.jsonl) as it changes. With --resume, directories the
+journal shows as done are skipped without being probed, as long as their input videos and
+options still match the recorded fingerprint and their grid is in place; the rest are processed
+as usual.
+With --queue, any number of workers (on nodes sharing the file system, or several on one
+machine) work through the same tree: directories are claimed from an SQLite queue
+(default: <start-dir>/.grid_queue.sqlite) under leases that each worker renews while it
+builds, and tasks of workers that stop renewing are taken over after --lease seconds
+(a worker that finds its lease taken over stops that build and drops its result).
+Workers exit once every directory is finished. The queue remembers finished and failed
+directories and queues them again when their videos or options change; delete it to build
+the whole tree again. Node clocks must be in sync, and the shared file system must support SQLite's file
+locking.
+With --metrics FILE, a JSON report with per-stage timings for every directory and totals is written.
+With --plan, every directory is probed and planned (one at a time) and a combined JSON plan
+with per-directory commands and summed estimates is printed or written instead of encoding.
 See 'python make_video_grid.py --help' for details on available options.
         """
     )
 
     parser.add_argument('--start-dir', type=str, default='.',
                        help='Starting directory (default: current directory)')
+    parser.add_argument('--clear-cache', action='store_true',
+                       help='Clear the ffprobe metadata and proxy caches once before processing')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                       help='Number of directories to process concurrently (default: 1)')
+    parser.add_argument('--job-memory', type=int, default=1024, metavar='MIB',
+                       help='Memory to reserve per concurrent job in MiB; with --jobs, jobs only '
+                            'start while this much is available (default: 1024)')
+    parser.add_argument('--scan-workers', type=int, default=1,
+                       help='Threads scanning top-level directories in parallel; directories are '
+                            'processed as they are found (default: 1, try 8 on network file systems)')
+    parser.add_argument('--force', action='store_true',
+                       help='Rebuild every grid, even if it is up to date')
+    parser.add_argument('--journal', type=str, metavar='FILE',
+                       help=f'Job journal to append directory states to '
+                            f'(default: <start-dir>/{DEFAULT_JOURNAL_NAME})')
+    parser.add_argument('--resume', action='store_true',
+                       help='Resume from the journal: skip directories it shows as finished')
+    parser.add_argument('--queue', type=str, nargs='?', const='', metavar='FILE',
+                       help=f'Work through the tree together with other workers using a shared '
+                            f'queue (default FILE: <start-dir>/{DEFAULT_QUEUE_NAME})')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE, metavar='SECONDS',
+                       help=f'With --queue, seconds before the directory of a worker that stopped '
+                            f'renewing its lease is taken over (default: {DEFAULT_LEASE:g})')
 
     # Parse known arguments and collect the rest to pass to make_video_grid
     args, grid_options = parser.parse_known_args()
 
+    # Parse the grid options once; every directory reuses the same settings
+    grid_args = build_grid_parser().parse_args(grid_options)
+    configure_processes(max_processes=grid_args.max_processes, timeout=grid_args.timeout,
+                        retries=grid_args.retries)
+
+    # Skip directories whose grid is up to date, unless --force
+    grid_args.incremental = not args.force
+
     start_dir = args.start_dir
 
     # Check if start directory exists
@@ -99,37 +317,345 @@ See 'python make_video_grid.py --help' for details on available options.
         print(f"Error: Directory '{start_dir}' does not exist", file=sys.stderr)
         return 1
 
-    # Find all subdirectories
+    if args.queue is not None and grid_args.plan is not None:
+        print("Error: --queue can't be combined with --plan", file=sys.stderr)
+        return 1
+
+    # With a plan on stdout, progress messages go to stderr
+    plans = [] if grid_args.plan is not None else None
+    reports = [] if grid_args.metrics else None
+    # Show the live progress of every running grid on one line on a terminal
+    display = None
+    if not grid_args.no_progress and plans is None and sys.stderr.isatty():
+        display = ProgressDisplay()
+
+    output = contextlib.nullcontext()
+    if grid_args.plan == '-':
+        output = contextlib.redirect_stdout(sys.stderr)
+    elif display:
+        output = contextlib.redirect_stdout(display)
+
+    started = time.perf_counter()
+    with output:
+        result = process_tree(args, grid_args, plans, reports, display)
+        if display:
+            display.close()
+
+    if plans is not None:
+        write_plan({
+            'script': 'make_video_grid_recursive.py',
+            'start_dir': start_dir,
+            'directories': plans,
+            'totals': total_estimates(plans),
+        }, grid_args.plan)
+
+    if reports is not None:
+        # Worker processes only count as children once the pool has shut them down
+        child_cpu, peak_rss = child_usage()
+        write_report({
+            'script': 'make_video_grid_recursive.py',
+            'result': result,
+            'jobs': args.jobs,
+            'wall': round(time.perf_counter() - started, 3),
+            'child_cpu': round(child_cpu, 3),
+            'peak_child_rss_kb': peak_rss,
+            'directories': sorted(reports, key=lambda report: report['directory']),
+            'totals': aggregate_stages(reports),
+        }, grid_args.metrics)
+
+    return result
+
+
+def process_tree(args, grid_args, plans=None, reports=None, on_progress=None):
+    """Build the grids of every subdirectory of args.start_dir and print a summary."""
+    start_dir = args.start_dir
+
+    # Clear the shared cache here rather than in every make_video_grid.py run
+    if args.clear_cache:
+        cache = ProbeCache()
+        cache.clear()
+        cache.close()
+        ProxyCache().clear()
+
     print(f"Searching for subdirectories in: {start_dir}")
     print("=" * 40)
 
-    subdirs = find_subdirectories(start_dir)
-
-    if not subdirs:
-        print("No subdirectories found.")
-        return 0
+    found_count = 0
 
     processed_count = 0
     failed_count = 0
     skipped_count = 0
-
-    # Process each subdirectory
-    for subdir in subdirs:
-        result = process_directory(subdir, grid_options)
-
-        if result is True:
+    fresh_count = 0
+    resumed_count = 0
+
+    # Workers sharing a queue record their progress in the queue instead of a journal
+    queue = None
+    if args.queue is not None:
+        queue = WorkQueue(args.queue or os.path.join(start_dir, DEFAULT_QUEUE_NAME),
+                          lease=args.lease)
+        print(f"Worker {queue.worker} using queue: {queue.path}")
+
+    # Plans build nothing, so they are not journaled
+    journal = None
+    if plans is None and queue is None:
+        journal = open_journal(args.journal or os.path.join(start_dir, DEFAULT_JOURNAL_NAME),
+                               resume=args.resume)
+        if journal and args.resume:
+            print(f"Resuming from journal: {journal.path} ({len(journal.states)} directories)")
+
+    def count(directory, result, outcome=None):
+        nonlocal processed_count, failed_count, skipped_count, fresh_count
+        # None means skipped
+        state = {UP_TO_DATE: UP_TO_DATE, True: DONE, False: FAILED, None: SKIPPED}[result]
+        if queue and not queue.complete(directory, state, **(outcome or {})):
+            print(f"Warning: lost the lease on {directory} to another worker; "
+                  f"dropping this worker's result, the other worker's counts instead",
+                  file=sys.stderr)
+            return
+        if journal:
+            journal.record(directory, state, **(outcome or {}))
+        if state == UP_TO_DATE:
+            fresh_count += 1
+        elif state == DONE:
             processed_count += 1
-        elif result is False:
+        elif state == FAILED:
             failed_count += 1
-        else:  # None means skipped
+        else:
             skipped_count += 1
 
+    cache_hits = 0
+    cache_misses = 0
+
+    # Planning is cheap, and plans can't be collected from worker processes
+    jobs = 1 if plans is not None else max(1, args.jobs)
+
+    if queue is None:
+        # Pipeline: scan -> probe -> build, each stage in its own thread(s). Directories are
+        # built as soon as they are found and probed, and probing overlaps with building;
+        # bounded queues keep the scan and probe stages only a few directories ahead.
+        scanned = stage(scan_tree(start_dir, workers=args.scan_workers),
+                        maxsize=SCAN_QUEUE_SIZE, name='scan')
+        # Directories finished before a resumed run don't need probing either
+        prefetch = prefetcher(grid_args, get_probe_cache(grid_args),
+                              journal if args.resume else None)
+        probed = stage(scanned, maxsize=jobs + 1, name='probe', transform=prefetch)
+    else:
+        # Every worker queues the whole tree (adding is idempotent), then claims directories
+        # from it one at a time. Claimed directories are listed again, as another worker
+        # may have scanned them long before; their videos are probed by the grid.
+        # Their current fingerprints (from file stats) requeue finished ones that changed.
+        selector = maker_from_args(grid_args)
+        queued = {}
+        for directory in scan_tree(start_dir, workers=args.scan_workers):
+            found_count += 1
+            if directory.videos:
+                selector.working_dir = directory.path
+                selector.scanned_files = directory.videos
+                current = selector.current_fingerprint()
+                queued[directory.path] = current[1] if current else None
+            else:
+                print(f"Skipping (no MP4 files found): {directory.path}")
+                skipped_count += 1
+        queue.add(queued)
+        queue.start_heartbeat()
+
+    def claimed():
+        """Yield directories claimed from the queue until none can be claimed right now."""
+        for path in iter(queue.claim, None):
+            yield ScannedDirectory(path, scan_directory(path)[1]), None
+
+    def video_directories():
+        """
+        Yield the probed (or claimed) directories that have MP4s, reporting the others as
+        skipped (and those finished before a resumed run as such).
+        """
+        nonlocal found_count, resumed_count
+        for directory, metadata in (probed if queue is None else claimed()):
+            if queue is None:
+                found_count += 1
+            if metadata is RESUMED:
+                print(f"Skipping (finished before resuming): {directory.path}")
+                resumed_count += 1
+                continue
+            if not directory.videos:
+                print(f"Skipping (no MP4 files found): {directory.path}")
+                count(directory.path, None)
+                continue
+            if journal:
+                journal.record(directory.path, PENDING)
+            yield directory, metadata
+
+    # Events that stop the build of each directory whose queue lease is lost
+    cancels = {}  # {directory path: Event}
+
+    def cancel_lost(directory):
+        cancel = cancels.get(directory)
+        if cancel is not None:
+            print(f"Warning: lost the lease on {directory} to another worker; "
+                  f"stopping its build", file=sys.stderr)
+            cancel.set()
+
+    if queue:
+        queue.on_lost = cancel_lost
+
+    if jobs == 1:
+        # Process each subdirectory; queue workers then wait for other workers' directories
+        # until they are all finished, in case a worker dies and its lease expires
+        while True:
+            for directory, metadata in video_directories():
+                if journal:
+                    journal.record(directory.path, RUNNING)
+                outcome = {}
+                if queue:
+                    cancels[directory.path] = threading.Event()
+                result = process_directory(directory.path, grid_args, plans=plans,
+                                           reports=reports, on_progress=on_progress,
+                                           videos=directory.videos, metadata=metadata,
+                                           outcome=outcome, cancel=cancels.get(directory.path))
+                cancels.pop(directory.path, None)
+                count(directory.path, result, outcome)
+            if queue is None or not queue.wait_for_work():
+                break
+
+        cache = get_probe_cache(grid_args)
+        if cache:
+            cache_hits, cache_misses = cache.hits, cache.misses
+    else:
+        # Split the machine between jobs so that their ffmpeg threads fit the CPUs
+        # (and the jobs fit in memory); each grid splits its budget between its own runs
+        governor = get_governor()
+        job_memory = args.job_memory * 1024 * 1024
+        jobs, cpu_budget = governor.split(jobs, job_memory)
+        print(f"Resources: {governor.describe()}")
+        if grid_args.threads:
+            print(f"Running {jobs} jobs with {grid_args.threads} ffmpeg threads per run")
+        else:
+            grid_args.cpu_budget = cpu_budget
+            print(f"Running {jobs} jobs with a budget of {cpu_budget} CPUs each")
+        if jobs < args.jobs:
+            print(f"  (--jobs {args.jobs} reduced to fit the CPUs and {args.job_memory} MiB per job)")
+
+        # Worker processes are not forked from this one: the scan, probe and process engine
+        # threads are running, and a fork while one of them holds a lock can deadlock the child
+        context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        )
+
+        # Workers send progress events through a managed queue, and are cancelled through
+        # managed events; a thread here forwards the progress events
+        manager = context.Manager() if on_progress is not None or queue else None
+        progress_queue = None
+        if on_progress is not None:
+            progress_queue = manager.Queue()
+
+            def forward():
+                for event in iter(progress_queue.get, None):
+                    on_progress(event)
+
+            forwarder = threading.Thread(target=forward, daemon=True)
+            forwarder.start()
+
+        executor = ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+        try:
+            # As above, queue workers wait for other workers' directories until all are done
+            while True:
+                directories = video_directories()
+                exhausted = False
+                running = {}  # {future: directory path}
+                held_back = False
+                while True:
+                    # Admit directories while a job slot is free and there is memory for them.
+                    # The next directory is only taken (claimed, with --queue) once it can start.
+                    while not exhausted and len(running) < jobs:
+                        if running and not governor.has_memory(job_memory):
+                            if not held_back:
+                                print(f"Waiting for {args.job_memory} MiB of free memory "
+                                      f"before starting more jobs")
+                                held_back = True
+                            break
+                        next_directory = next(directories, None)
+                        if next_directory is None:
+                            exhausted = True
+                            break
+                        directory, metadata = next_directory
+                        if journal:
+                            journal.record(directory.path, RUNNING)
+                        if queue:
+                            cancels[directory.path] = manager.Event()
+                        future = executor.submit(run_buffered_job, directory.path, grid_args,
+                                                 progress_queue, directory.videos, metadata,
+                                                 cancels.get(directory.path))
+                        running[future] = directory.path
+                    if not running:
+                        break
+
+                    # Poll while jobs are held back, so they start as soon as memory frees up
+                    polling = not exhausted and len(running) < jobs
+                    done, _ = wait(running, timeout=ADMISSION_POLL if polling else None,
+                                   return_when=FIRST_COMPLETED)
+                    if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                        # A worker died (e.g. killed by the OOM killer), which fails every job
+                        # of the pool: collect them all and go on with a new pool
+                        executor.shutdown(wait=True)
+                        done = list(running)
+                        executor = ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+                    for future in done:
+                        directory = running.pop(future)
+                        cancels.pop(directory, None)
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            print(f"✗ Worker process died while processing: {directory}",
+                                  file=sys.stderr)
+                            count(directory, False)
+                            continue
+                        result, output, (hits, misses), job_reports, outcome = future.result()
+                        print(output, end='', flush=True)
+                        count(directory, result, outcome)
+                        cache_hits += hits
+                        cache_misses += misses
+                        if reports is not None:
+                            reports.extend(job_reports)
+
+                if queue is None or not queue.wait_for_work():
+                    break
+        finally:
+            executor.shutdown()
+
+        if progress_queue is not None:
+            progress_queue.put(None)
+            forwarder.join()
+        if manager is not None:
+            manager.shutdown()
+
+        # The probe stage ran in this process, with this process's cache
+        cache = get_probe_cache(grid_args)
+        if cache:
+            cache_hits += cache.hits
+            cache_misses += cache.misses
+
+    if journal:
+        journal.close()
+    if queue:
+        queue_counts = queue.counts()
+        queue.close()
+
+    if found_count == 0:
+        print("No subdirectories found.")
+        return 0
+
     # Print summary
     print("\n" + "=" * 40)
     print("Summary:")
     print(f"  Successfully processed: {processed_count}")
     print(f"  Failed: {failed_count}")
     print(f"  Skipped (no MP4s): {skipped_count}")
+    print(f"  Skipped (up to date): {fresh_count}")
+    if args.resume:
+        print(f"  Skipped (finished before resuming): {resumed_count}")
+    if queue:
+        print("  Queue (all workers): " + ", ".join(
+            f"{n} {state}" for state, n in sorted(queue_counts.items())))
+    if not grid_args.no_cache:
+        print(f"  Probe cache: {cache_hits} hits, {cache_misses} misses")
     print("=" * 40)
 
     return 0 if failed_count == 0 else 1
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk caches shared by the video scripts.
+Cache files live in $VIDEO_SCRIPTS_CACHE_DIR, or $XDG_CACHE_HOME/video_scripts
+(default: ~/.cache/video_scripts).
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from dataclasses import astuple
+
+from video_probe import VideoMetadata
+
+
+def cache_root():
+    """Return the directory holding all cache files for the video scripts."""
+    root = os.environ.get('VIDEO_SCRIPTS_CACHE_DIR')
+    if not root:
+        xdg = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        root = os.path.join(xdg, 'video_scripts')
+    return root
+
+
+def file_key(path):
+    """Return the (absolute path, size, mtime_ns) key identifying a file's current contents."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+class ProbeCache:
+    """
+    SQLite-backed cache of ffprobe results keyed on (path, size, mtime_ns).
+    An entry is only returned while the file's size and mtime still match,
+    so modified files are re-probed automatically.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(cache_root(), 'probe_cache.sqlite')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probe ("
+                " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                " version INTEGER, duration REAL, fps REAL, avg_fps REAL,"
+                " width INTEGER, height INTEGER, frame_count INTEGER, codec TEXT)"
+            )
+            self._conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: probe cache disabled ({self.db_path}: {e})", file=sys.stderr)
+            self._conn = None
+
+    def get(self, video_path):
+        """Return cached VideoMetadata for a video, or None on a miss."""
+        row = None
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    path, size, mtime_ns = file_key(video_path)
+                    row = self._conn.execute(
+                        "SELECT duration, fps, avg_fps, width, height, frame_count, codec"
+                        " FROM probe WHERE path=? AND size=? AND mtime_ns=? AND version=?",
+                        (path, size, mtime_ns, self.SCHEMA_VERSION)
+                    ).fetchone()
+                except (OSError, sqlite3.Error):
+                    row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return VideoMetadata(video_path, *row)
+
+    def put(self, metadata):
+        """Store a VideoMetadata record, replacing any stale entry for the same path."""
+        if self._conn is None:
+            return
+
+        try:
+            path, size, mtime_ns = file_key(metadata.path)
+            values = astuple(metadata)[1:]  # Everything except the path
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, self.SCHEMA_VERSION) + values
+                )
+                self._conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: could not write probe cache entry for {metadata.path}: {e}",
+                  file=sys.stderr)
+
+    def clear(self):
+        """Remove every cached entry."""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM probe")
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def summary(self):
+        """Return a one-line hit/miss report."""
+        return f"Probe cache: {self.hits} hits, {self.misses} misses"
+
+
+class PaletteCache:
+    """
+    Content-addressed store of GIF palettes.
+    Palettes are keyed on a hash of the frame images and the palettegen options,
+    so re-rendering the same frames can skip the palettegen pass.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(cache_root(), 'palettes')
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(frame_paths, palettegen_options):
+        """Hash the frame contents, in order, together with the palettegen options."""
+        digest = hashlib.sha256(palettegen_options.encode())
+        for frame_path in frame_paths:
+            with open(frame_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the path of a cached palette, or None on a miss."""
+        path = os.path.join(self.cache_dir, f"{key}.png")
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def put(self, key, palette_path):
+        """Copy a generated palette into the cache (atomically, so readers never see partial files)."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(fd)
+            shutil.copyfile(palette_path, temp_path)
+            os.replace(temp_path, os.path.join(self.cache_dir, f"{key}.png"))
+        except OSError as e:
+            print(f"Warning: could not cache palette: {e}", file=sys.stderr)
+
+    def clear(self):
+        """Remove every cached palette."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def summary(self):
+        """Return a one-line hit/miss report."""
+        return f"Palette cache: {self.hits} hits, {self.misses} misses"
+
+
+class ProxyCache:
+    """
+    Store of per-cell proxy videos: sources already converted to the cell's frame rate,
+    width and padding. Proxies are keyed on the source's (path, size, mtime_ns) and the
+    normalizing filters and encoder arguments, so any change to either makes a new proxy.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(cache_root(), 'proxies')
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(video_path, filters, output_args):
+        """Hash the source's file key together with the filters and encoder arguments."""
+        path, size, mtime_ns = file_key(video_path)
+        digest = hashlib.sha256(
+            "\0".join([path, str(size), str(mtime_ns), filters] + list(output_args)).encode()
+        )
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Return the path a proxy is stored at."""
+        return os.path.join(self.cache_dir, f"{key}.mkv")
+
+    def get(self, key):
+        """Return the path of a cached proxy, or None on a miss."""
+        path = self.path(key)
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def temp_path(self):
+        """Return a new temporary .mkv path in the cache directory to encode a proxy into."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp.mkv')
+        os.close(fd)
+        return temp_path
+
+    def put(self, key, temp_path):
+        """Move an encoded proxy from temp_path into the cache and return its final path."""
+        path = self.path(key)
+        os.replace(temp_path, path)
+        return path
+
+    def clear(self):
+        """Remove every cached proxy."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def summary(self):
+        """Return a one-line hit/miss report."""
+        return f"Proxy cache: {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Append-only job journal for recursive grid runs.
+Every state change of a directory (pending, running, done, failed, ...) is appended to a
+JSON-lines file as it happens, so that a run that dies halfway can be resumed: replaying
+the journal gives the last known state of every directory.
+"""
+
+import json
+import os
+import sys
+import time
+
+
+# Directory states, in the order a directory goes through them
+PENDING = 'pending'  # Found and probed, waiting for a job slot
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'  # No MP4 files
+UP_TO_DATE = 'up-to-date'
+
+# States that need no further work when a run is resumed
+FINISHED_STATES = (DONE, UP_TO_DATE)
+
+DEFAULT_JOURNAL_NAME = '.grid_journal.jsonl'
+
+
+class JobJournal:
+    """
+    JSON-lines journal of one (possibly resumed) recursive run.
+    Each line is {"time", "directory", "state"} plus "output" and "fingerprint" for built
+    directories. A new run starts an empty journal; a resumed run replays the existing one
+    into `states` and keeps appending to it.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.states = self.replay(path) if resume else {}
+        self._file = open(path, 'a' if resume else 'w')
+        if resume and self._file.tell() and not self.ends_with_newline(path):
+            self._file.write("\n")  # Don't append to a line cut short by a crash
+
+    @staticmethod
+    def ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def replay(path):
+        """Return the last record of every directory in a journal ({} if there is none)."""
+        states = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # E.g. a line cut short by the crash being resumed from
+                    states[record['directory']] = record
+        except OSError:
+            pass
+        return states
+
+    def record(self, directory, state, **fields):
+        """Append a state change; finished states are flushed to disk before returning."""
+        record = {'time': round(time.time(), 3), 'directory': directory, 'state': state, **fields}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if state in (DONE, FAILED):
+            os.fsync(self._file.fileno())
+        self.states[directory] = record
+
+    def finished(self, directory, output, fingerprint):
+        """
+        Whether the journal shows directory as finished, building output from fingerprint:
+        the directory's current fingerprint, so that one changed since it was built is not.
+        Callers still check that the output itself is in place.
+        """
+        record = self.states.get(directory)
+        if record is None or record['state'] not in FINISHED_STATES:
+            return False
+        return record.get('output') == output and record.get('fingerprint') == fingerprint
+
+    def close(self):
+        self._file.close()
+
+
+def open_journal(path, resume=False):
+    """Open a JobJournal, or warn and return None if the file can't be written."""
+    try:
+        return JobJournal(path, resume)
+    except OSError as e:
+        print(f"Warning: job journal disabled ({path}: {e})", file=sys.stderr)
+        return None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and resource instrumentation for the video scripts.
+Records wall time per stage (probe, extract, palette, encode, ...), the CPU time and
+peak RSS of the ffmpeg/ffprobe child processes, and the frame rate and speed that each
+ffmpeg run reports through -progress. Reports are plain dicts written as JSON.
+"""
+
+import contextlib
+import json
+import resource
+import threading
+import time
+
+
+def child_usage():
+    """Return (CPU seconds, peak RSS in KiB) of all terminated child processes so far."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+
+def summarize_progress(values):
+    """
+    Convert the raw key=value fields of an ffmpeg -progress block into
+    {'frames', 'fps', 'speed', 'out_time'}. Values ffmpeg reports as N/A are None.
+    """
+    def number(key, convert=float, suffix=''):
+        value = values.get(key, 'N/A').rstrip(suffix).strip()
+        try:
+            return convert(value)
+        except ValueError:
+            return None
+
+    out_time_us = number('out_time_us', int)
+    return {
+        'frames': number('frame', int),
+        'fps': number('fps'),
+        'speed': number('speed', suffix='x'),
+        'out_time': out_time_us / 1e6 if out_time_us is not None else None,
+    }
+
+
+class RunMetrics:
+    """
+    Collects stage timings for one run. Stages are timed with `with metrics.stage(name):`;
+    ffmpeg runs started inside a stage (see video_progress.run_ffmpeg) are attributed to it.
+    Child CPU time is the stage's delta of RUSAGE_CHILDREN; peak RSS is the largest child
+    seen by the end of the stage. Stages must not overlap, but ffmpeg runs within a stage
+    may come from several threads.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.current_stage = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a stage; repeated stages with the same name are accumulated."""
+        previous = self.current_stage
+        self.current_stage = name
+        start = time.perf_counter()
+        cpu_start, _ = child_usage()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            cpu_end, peak_rss = child_usage()
+            self.current_stage = previous
+            with self._lock:
+                entry = self._entry(name)
+                entry['count'] += 1
+                entry['wall'] += wall
+                entry['child_cpu'] += cpu_end - cpu_start
+                entry['peak_child_rss_kb'] = max(entry['peak_child_rss_kb'], peak_rss)
+
+    def _entry(self, name):
+        """Return the record of a stage, creating it if needed (caller holds the lock)."""
+        if name not in self.stages:
+            self.stages[name] = {'count': 0, 'wall': 0.0, 'child_cpu': 0.0,
+                                 'peak_child_rss_kb': 0, 'ffmpeg': []}
+        return self.stages[name]
+
+    def record_ffmpeg(self, wall, progress):
+        """Attribute one ffmpeg run (its wall time and parsed -progress values) to the current stage."""
+        with self._lock:
+            self._entry(self.current_stage or 'other')['ffmpeg'].append(
+                dict(progress, wall=round(wall, 3))
+            )
+
+    def report(self):
+        """Return the metrics as a JSON-serializable dict."""
+        with self._lock:
+            stages = {name: dict(entry, wall=round(entry['wall'], 3),
+                                 child_cpu=round(entry['child_cpu'], 3))
+                      for name, entry in self.stages.items()}
+        return {'wall': round(time.perf_counter() - self.started, 3), 'stages': stages}
+
+
+def timed(metrics, name):
+    """metrics.stage(name), or a no-op context if metrics is None."""
+    if metrics is None:
+        return contextlib.nullcontext()
+    return metrics.stage(name)
+
+
+def aggregate_stages(reports):
+    """Sum the per-stage wall time, child CPU time and run counts of several reports."""
+    totals = {}
+    for report in reports:
+        for name, entry in report.get('stages', {}).items():
+            total = totals.setdefault(name, {'count': 0, 'wall': 0.0, 'child_cpu': 0.0,
+                                             'peak_child_rss_kb': 0, 'ffmpeg_runs': 0})
+            total['count'] += entry['count']
+            total['wall'] = round(total['wall'] + entry['wall'], 3)
+            total['child_cpu'] = round(total['child_cpu'] + entry['child_cpu'], 3)
+            total['peak_child_rss_kb'] = max(total['peak_child_rss_kb'], entry['peak_child_rss_kb'])
+            total['ffmpeg_runs'] += len(entry['ffmpeg'])
+    return totals
+
+
+def write_report(report, path):
+    """Write a metrics report as JSON."""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Metrics written to: {path}")
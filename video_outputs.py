@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Extra outputs rendered alongside a grid video in the same ffmpeg run.
+The grid's final stream is split, and each extra output (palette GIF, poster PNG, low-res
+preview MP4) gets its own branch of the filtergraph, so the sources are decoded and
+composited once for all of them.
+"""
+
+import os
+from dataclasses import dataclass, fields, replace
+
+from encode_profiles import get_profile, x264_args
+
+
+# Settings of each kind of output, used for any that a spec leaves out
+OUTPUT_DEFAULTS = {
+    'gif': {'fps': 10, 'width': 480},
+    'poster': {'time': None, 'width': 0},  # time None = middle of the grid; width 0 = full size
+    'preview': {'width': 480},
+}
+
+# Default output name: the grid's name with its extension replaced by this suffix
+OUTPUT_SUFFIXES = {
+    'gif': '.gif',
+    'poster': '.png',
+    'preview': '_preview.mp4',
+}
+
+# Encode profile of preview MP4s (see encode_profiles.py)
+PREVIEW_PROFILE = 'preview'
+
+
+@dataclass(frozen=True)
+class OutputTarget:
+    """One extra output of a grid, parsed from a spec like 'gif:fps=8:width=320'."""
+    kind: str  # 'gif', 'poster' or 'preview'
+    path: str = None  # None = named after the grid (see OUTPUT_SUFFIXES)
+    fps: float = None  # GIF frame rate
+    width: int = None  # Output width in pixels (0 = the grid's width)
+    time: float = None  # Poster time in seconds
+
+    def resolved(self, output_file):
+        """
+        Return a copy with the defaults filled in and path resolved next to output_file
+        (relative paths are relative to the grid's directory).
+        """
+        values = {name: value for name, value in OUTPUT_DEFAULTS[self.kind].items()
+                  if getattr(self, name) is None}
+        stem = os.path.splitext(output_file)[0]
+        if self.path is None:
+            values['path'] = stem + OUTPUT_SUFFIXES[self.kind]
+        elif not os.path.isabs(self.path):
+            values['path'] = os.path.join(os.path.dirname(output_file), self.path)
+        return replace(self, **values)
+
+    def build_filter(self, source, label, profile, duration=None):
+        """
+        Filters turning the grid stream [source] into this output's stream [label].
+        profile is the grid's EncodeProfile, whose GIF settings the GIF palette uses;
+        duration (the grid's, in seconds) places a default or too-late poster time.
+        """
+        scale = ""
+        if self.width:
+            # MP4s need even dimensions, images don't
+            scale = f"scale={self.width}:{-2 if self.kind == 'preview' else -1}"
+            if self.kind == 'gif' and profile.gif_scale_flags:
+                scale += f":flags={profile.gif_scale_flags}"
+
+        if self.kind == 'gif':
+            chain = ",".join(filter(None, [f"fps={self.fps:g}", scale]))
+            return (f"[{source}]{chain},split[{label}_a][{label}_b]; "
+                    f"[{label}_a]palettegen=max_colors={profile.gif_max_colors}:"
+                    f"stats_mode={profile.gif_stats_mode}[{label}_p]; "
+                    f"[{label}_b][{label}_p]paletteuse=dither={profile.gif_dither}[{label}]")
+
+        if self.kind == 'poster':
+            time = self.time
+            if duration:
+                time = duration / 2 if time is None else min(time, max(0.0, duration - 0.1))
+            chain = ",".join(filter(None, [f"trim=start={time or 0}", "setpts=PTS-STARTPTS", scale]))
+            return f"[{source}]{chain}[{label}]"
+
+        # Rounding to even dimensions slightly changes the aspect ratio; keep square pixels
+        return f"[{source}]{scale + ',setsar=1' if scale else 'null'}[{label}]"
+
+    def output_args(self, threads=0):
+        """ffmpeg output options for this output (without -map and the path)."""
+        if self.kind == 'gif':
+            return ['-loop', '0']
+        if self.kind == 'poster':
+            return ['-frames:v', '1', '-update', '1']
+        return x264_args(get_profile(PREVIEW_PROFILE), threads=threads)
+
+
+def parse_output_target(spec):
+    """
+    Parse an extra output spec: a kind followed by optional key=value settings, e.g. 'gif',
+    'gif:fps=8:width=320', 'poster:time=2.5:path=cover.png' or 'preview:width=320'.
+    path must come last if it contains ':'. Raises ValueError for invalid specs.
+    """
+    kind, _, settings = spec.partition(':')
+    if kind not in OUTPUT_DEFAULTS:
+        raise ValueError(f"Unknown output kind '{kind}' in '{spec}' "
+                         f"(choose from: {', '.join(OUTPUT_DEFAULTS)})")
+
+    types = {field.name: field.type for field in fields(OutputTarget)}
+    values = {}
+    while settings:
+        key, sep, rest = settings.partition('=')
+        if not sep:
+            raise ValueError(f"Expected key=value in '{spec}', got '{settings}'")
+        value, _, settings = (rest, '', '') if key == 'path' else rest.partition(':')
+        if key == 'path':
+            values['path'] = value
+        elif key in OUTPUT_DEFAULTS[kind]:
+            try:
+                values[key] = types[key](value)
+            except ValueError:
+                raise ValueError(f"Invalid {key} '{value}' in '{spec}'")
+        else:
+            raise ValueError(f"Unknown setting '{key}' for {kind} outputs in '{spec}' "
+                             f"(choose from: {', '.join(list(OUTPUT_DEFAULTS[kind]) + ['path'])})")
+    return OutputTarget(kind, **values)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Threaded pipeline stages joined by bounded queues.
+Each stage consumes an iterable in a background thread, optionally transforms every item,
+and hands the results to the next stage through a queue of limited size, so a fast stage
+blocks (backpressure) instead of running arbitrarily far ahead of a slow one.
+"""
+
+import queue
+import threading
+
+
+# Seconds between checks for a stopped consumer while a stage waits on a full queue
+STOP_POLL = 0.2
+
+_DONE = object()
+
+
+class _Failure:
+    """An exception raised inside a stage, passed to the consumer to re-raise."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def stage(items, transform=None, maxsize=8, name='stage'):
+    """
+    Run a pipeline stage: a thread iterates over items, applies transform (if given) to each,
+    and puts the results into a queue holding at most maxsize items. Returns a generator that
+    yields the results in order as they become available. Errors in the stage are re-raised
+    in the consumer; closing the generator early stops the stage.
+    """
+    results = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item):
+        """Put an item, giving up if the consumer has gone away. Returns False then."""
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=STOP_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in items:
+                if not put(transform(item) if transform is not None else item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    thread = threading.Thread(target=run, daemon=True, name=name)
+    thread.start()
+
+    def consume():
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+
+    return consume()
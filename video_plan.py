@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Dry-run plans for the video scripts.
+A plan describes what a run would do without running it: the probed inputs, the
+geometry, every ffmpeg command with its filtergraph, and decode/encode cost estimates.
+"""
+
+import json
+import math
+import sys
+from dataclasses import asdict
+
+
+def input_records(metadata_list):
+    """Return the probed metadata of every input as JSON-serializable dicts."""
+    return [asdict(metadata) for metadata in metadata_list]
+
+
+def frame_count(metadata):
+    """Number of frames in a video, estimated from duration * fps if ffprobe didn't count them."""
+    if metadata.frame_count:
+        return metadata.frame_count
+    return int(math.ceil(metadata.duration * metadata.fps))
+
+
+def filtergraphs(commands):
+    """Return the filtergraph (-filter_complex, -lavfi or -vf) of every command that has one."""
+    graphs = []
+    for cmd in commands:
+        for option in ('-filter_complex', '-lavfi', '-vf'):
+            if option in cmd:
+                graphs.append(cmd[cmd.index(option) + 1])
+    return graphs
+
+
+def with_filtergraphs(plan):
+    """Return a copy of a plan with the filtergraphs of its commands listed separately."""
+    if 'directories' in plan:
+        return dict(plan, directories=[with_filtergraphs(p) for p in plan['directories']])
+    return dict(plan, filtergraphs=filtergraphs(plan.get('commands', [])))
+
+
+def total_estimates(plans):
+    """Sum the estimates and command counts of several plans (e.g. one per directory)."""
+    totals = {'commands': 0}
+    for plan in plans:
+        totals['commands'] += len(plan.get('commands', []))
+        for name, value in plan.get('estimates', {}).items():
+            if name not in ('duration', 'output_fps'):
+                totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def write_plan(plan, destination):
+    """Write a plan as JSON to a file, or to stdout if destination is '-'."""
+    plan = with_filtergraphs(plan)
+    if destination == '-':
+        json.dump(plan, sys.stdout, indent=2)
+        print()
+        return
+
+    with open(destination, 'w') as f:
+        json.dump(plan, f, indent=2)
+        f.write("\n")
+    print(f"Plan written to: {destination}", file=sys.stderr)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Shared ffprobe helpers for the video scripts.
+Reads every field the scripts need from a video with a single JSON ffprobe call,
+and probes many videos at once through a bounded thread pool.
+"""
+
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from video_process import run_process
+from video_resources import get_governor
+
+
+# Upper bound on concurrent ffprobe processes
+DEFAULT_PROBE_WORKERS = min(8, get_governor().cpus)
+
+
+@dataclass(frozen=True)
+class VideoMetadata:
+    """Metadata of the first video stream in a file."""
+    path: str
+    duration: float  # Container duration in seconds
+    fps: float  # Real base frame rate (r_frame_rate)
+    avg_fps: float  # Average frame rate (avg_frame_rate), 0 if unknown
+    width: int
+    height: int
+    frame_count: int  # nb_frames, or estimated from duration * fps
+    codec: str
+
+
+def parse_frame_rate(rate_str):
+    """Convert an ffprobe rate such as '30000/1001' to a float (0.0 if undefined)."""
+    if not rate_str:
+        return 0.0
+    if '/' in rate_str:
+        num, den = map(float, rate_str.split('/'))
+        return num / den if den else 0.0
+    return float(rate_str)
+
+
+def probe_video(video_path, cache=None):
+    """
+    Probe a video with one ffprobe call. Raises on failure (video_process.ProcessError
+    quotes ffprobe's error message).
+    If a ProbeCache is given, a fresh cached entry is returned without running ffprobe.
+    """
+    if cache is not None:
+        metadata = cache.get(video_path)
+        if metadata is not None:
+            return metadata
+
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries',
+        'format=duration:stream=codec_name,width,height,r_frame_rate,avg_frame_rate,nb_frames,duration',
+        '-of', 'json', video_path
+    ]
+    info = json.loads(run_process(cmd, capture_stdout=True, check=True).stdout)
+
+    streams = info.get('streams') or []
+    if not streams:
+        raise ValueError("no video stream found")
+    stream = streams[0]
+
+    # Prefer the container duration, fall back to the stream duration
+    duration_str = info.get('format', {}).get('duration') or stream.get('duration')
+    duration = float(duration_str)
+
+    fps = parse_frame_rate(stream.get('r_frame_rate'))
+    avg_fps = parse_frame_rate(stream.get('avg_frame_rate'))
+
+    nb_frames = stream.get('nb_frames')
+    if nb_frames and str(nb_frames).isdigit():
+        frame_count = int(nb_frames)
+    else:
+        frame_count = int(round(duration * fps))
+
+    metadata = VideoMetadata(
+        path=video_path,
+        duration=duration,
+        fps=fps,
+        avg_fps=avg_fps,
+        width=int(stream['width']),
+        height=int(stream['height']),
+        frame_count=frame_count,
+        codec=stream.get('codec_name', ''),
+    )
+
+    if cache is not None:
+        cache.put(metadata)
+    return metadata
+
+
+def probe_videos(video_paths, max_workers=DEFAULT_PROBE_WORKERS, cache=None):
+    """
+    Probe several videos concurrently.
+    Returns a list of VideoMetadata in input order, with None for videos that failed.
+    """
+    def probe_or_none(video_path):
+        try:
+            return probe_video(video_path, cache=cache)
+        except Exception as e:
+            print(f"Error getting metadata for {video_path}: {e}", file=sys.stderr)
+            return None
+
+    if len(video_paths) <= 1 or max_workers <= 1:
+        return [probe_or_none(v) for v in video_paths]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(video_paths))) as executor:
+        return list(executor.map(probe_or_none, video_paths))
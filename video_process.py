@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Shared asyncio process engine for the video scripts.
+Every ffmpeg/ffprobe call goes through one event loop running on a background thread, so a
+single limit bounds the number of concurrent processes across the probe, extract and encode
+stages, whichever thread they are started from. Runs can time out, be cancelled, retry
+transient failures, and keep their stderr for error reports.
+"""
+
+import asyncio
+import atexit
+import codecs
+import errno
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from video_resources import get_governor
+
+
+# Upper bound on concurrent child processes (per script process): one per usable CPU
+DEFAULT_MAX_PROCESSES = get_governor().cpus
+# Extra attempts after a transient failure
+DEFAULT_RETRIES = 2
+# Seconds before the first retry; doubled for every further attempt
+RETRY_DELAY = 0.5
+# Seconds a process gets to exit after SIGTERM before it is killed
+TERMINATE_GRACE = 2.0
+# Lines of stderr quoted in error reports
+STDERR_TAIL_LINES = 5
+
+# Failures that are worth retrying: the machine was short of processes, memory or files
+TRANSIENT_ERRNOS = {errno.EAGAIN, errno.ENOMEM, errno.EMFILE, errno.ENFILE}
+TRANSIENT_MESSAGES = ('Resource temporarily unavailable', 'Cannot allocate memory',
+                      'Too many open files')
+
+
+class ProcessResult(subprocess.CompletedProcess):
+    """A CompletedProcess that also records timeouts, attempts and the run's wall time."""
+
+    def __init__(self, args, returncode, stdout=None, stderr=None, timed_out=False,
+                 attempts=1, elapsed=0.0):
+        super().__init__(args, returncode, stdout, stderr)
+        self.timed_out = timed_out
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+    def stderr_tail(self, lines=STDERR_TAIL_LINES):
+        """Return the last lines of stderr."""
+        return "\n".join((self.stderr or "").strip().splitlines()[-lines:])
+
+    def describe_failure(self):
+        """Describe why the process failed, quoting the end of its stderr."""
+        name = os.path.basename(self.args[0])
+        if self.timed_out:
+            reason = f"{name} timed out"
+        elif self.returncode < 0:
+            try:
+                reason = f"{name} was killed by {signal.Signals(-self.returncode).name}"
+            except ValueError:
+                reason = f"{name} was killed by signal {-self.returncode}"
+        else:
+            reason = f"{name} exited with status {self.returncode}"
+        if self.attempts > 1:
+            reason += f" after {self.attempts} attempts"
+        tail = self.stderr_tail()
+        return f"{reason}: {tail}" if tail else reason
+
+    def check_returncode(self):
+        """Raise ProcessError if the process failed."""
+        if self.returncode != 0 or self.timed_out:
+            raise ProcessError(self)
+
+    def is_transient(self):
+        """Whether the failure looks like a temporary resource shortage worth retrying."""
+        if self.returncode == -signal.SIGKILL and not self.timed_out:
+            return True  # Most likely the OOM killer
+        return any(message in (self.stderr or "") for message in TRANSIENT_MESSAGES)
+
+
+class ProcessError(Exception):
+    """A process run with check=True failed; the result (with its stderr) is attached."""
+
+    def __init__(self, result):
+        super().__init__(result.describe_failure())
+        self.result = result
+
+
+class ProcessGroup:
+    """
+    Runs that can be cancelled together, e.g. the ffmpeg runs of one grid or GIF, without
+    touching other runs of the shared engine. Pass it as run_async's group.
+    """
+
+    def __init__(self):
+        self.cancelled = False  # Set by ProcessEngine.cancel_group; later runs are refused
+        self.tasks = set()
+
+
+class ProcessEngine:
+    """
+    Runs child processes on an asyncio event loop in a background thread.
+    At most max_processes children run at once; further runs wait for a slot.
+    Synchronous callers use run() (blocking) or submit() (returns a concurrent.futures.Future),
+    so existing thread pools can keep their structure while sharing the one limit.
+    """
+
+    def __init__(self, max_processes=DEFAULT_MAX_PROCESSES, timeout=None, retries=DEFAULT_RETRIES):
+        self.max_processes = max(1, max_processes)
+        self.timeout = timeout  # Default per-run timeout in seconds (None = no limit)
+        self.retries = retries  # Default extra attempts after transient failures
+        self.pid = os.getpid()
+        self.tasks = set()
+        self._semaphore = None  # Created on the loop
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True,
+                                        name='process-engine')
+        self._thread.start()
+
+    async def run_async(self, cmd, on_stdout=None, capture_stdout=False, echo_stderr=False,
+                        on_start=None, timeout=None, retries=None, check=False, group=None):
+        """
+        Run cmd and return a ProcessResult; stderr is always captured (as text).
+        on_stdout(line) is called for every stdout line as it arrives; with capture_stdout the
+        whole stdout is returned instead; otherwise stdout is inherited.
+        With echo_stderr, stderr is also copied to sys.stderr as it arrives.
+        on_start() is called when an attempt's process has started.
+        timeout and retries default to the engine's settings. Failures to start the process
+        and failed runs that look like resource shortages are retried with a growing delay;
+        timed-out and cancelled runs are not. With check, a failure raises ProcessError.
+        A run in a ProcessGroup that has been cancelled is cancelled before it starts.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+
+        task = asyncio.current_task()
+        if group is not None:
+            if group.cancelled:
+                raise asyncio.CancelledError()
+            group.tasks.add(task)
+        self.tasks.add(task)
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    result = await self._run_once(cmd, on_stdout, capture_stdout, echo_stderr,
+                                                  on_start, timeout)
+                except OSError as e:
+                    if e.errno not in TRANSIENT_ERRNOS or attempt > retries:
+                        raise
+                else:
+                    if result.returncode == 0 or attempt > retries or not result.is_transient():
+                        break
+                await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+            result.attempts = attempt
+            if check:
+                result.check_returncode()
+            return result
+        finally:
+            self.tasks.discard(task)
+            if group is not None:
+                group.tasks.discard(task)
+
+    async def _run_once(self, cmd, on_stdout, capture_stdout, echo_stderr, on_start, timeout):
+        """Run one attempt of a command while holding a process slot."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_processes)
+
+        async with self._semaphore:
+            pipe_stdout = on_stdout is not None or capture_stdout
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=subprocess.PIPE if pipe_stdout else None, stderr=subprocess.PIPE
+            )
+            if on_start is not None:
+                on_start()
+
+            stdout_lines = []
+            stderr_chunks = []
+            readers = [self._read_stderr(process.stderr, stderr_chunks, echo_stderr)]
+            if pipe_stdout:
+                readers.append(self._read_stdout(process.stdout, on_stdout, stdout_lines))
+
+            timed_out = False
+            try:
+                await asyncio.wait_for(asyncio.gather(process.wait(), *readers), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                await self._stop(process)
+                stderr_chunks.append(f"\nTimed out after {timeout:g}s\n")
+            except asyncio.CancelledError:
+                await self._stop(process)
+                raise
+
+            return ProcessResult(
+                list(cmd), process.returncode,
+                stdout="".join(stdout_lines) if capture_stdout else None,
+                stderr="".join(stderr_chunks), timed_out=timed_out,
+                elapsed=time.perf_counter() - start
+            )
+
+    @staticmethod
+    async def _read_stdout(stream, on_stdout, lines):
+        """Pass stdout lines to on_stdout, or collect them."""
+        async for line in stream:
+            text = line.decode(errors='replace')
+            if on_stdout is not None:
+                on_stdout(text)
+            else:
+                lines.append(text)
+
+    @staticmethod
+    async def _read_stderr(stream, chunks, echo):
+        """Collect stderr (optionally echoing it) without waiting for whole lines."""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            data = await stream.read(65536)
+            text = decoder.decode(data, final=not data)
+            if text:
+                chunks.append(text)
+                if echo:
+                    sys.stderr.write(text)
+                    sys.stderr.flush()
+            if not data:
+                return
+
+    @staticmethod
+    async def _stop(process):
+        """Terminate a process, killing it if it doesn't exit within TERMINATE_GRACE."""
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), TERMINATE_GRACE)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+
+    def submit(self, cmd, **kwargs):
+        """Start run_async(cmd, **kwargs) and return a concurrent.futures.Future of its result."""
+        return asyncio.run_coroutine_threadsafe(self.run_async(cmd, **kwargs), self.loop)
+
+    def run(self, cmd, **kwargs):
+        """Run a command and wait for its ProcessResult (see run_async for the options)."""
+        future = self.submit(cmd, **kwargs)
+        try:
+            return future.result()
+        except BaseException:
+            # E.g. KeyboardInterrupt: stop the process rather than leaving it running
+            future.cancel()
+            raise
+
+    def cancel_group(self, group):
+        """
+        Cancel the pending and running commands of a ProcessGroup (running processes are
+        terminated), and any started in it later.
+        """
+        def cancel():
+            group.cancelled = True
+            for task in list(group.tasks):
+                task.cancel()
+        self.loop.call_soon_threadsafe(cancel)
+
+    def close(self):
+        """Cancel all commands and stop the event loop."""
+        if self.pid != os.getpid() or self.loop.is_closed():
+            return  # Inherited through fork; the loop thread only exists in the parent
+
+        async def shutdown():
+            tasks = [task for task in self.tasks if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_settings = {'max_processes': DEFAULT_MAX_PROCESSES, 'timeout': None, 'retries': DEFAULT_RETRIES}
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def configure_processes(max_processes=None, timeout=None, retries=None):
+    """
+    Change the settings of the shared engine (None keeps a setting).
+    Call before running processes; an idle engine is replaced by one with the new settings.
+    """
+    global _engine
+    changes = {name: value for name, value in (('max_processes', max_processes),
+                                                ('timeout', timeout), ('retries', retries))
+               if value is not None and value != _settings[name]}
+    if not changes:
+        return
+    _settings.update(changes)
+
+    with _engine_lock:
+        if _engine is not None and _engine.pid == os.getpid():
+            _engine.close()
+        _engine = None
+
+
+def get_engine():
+    """Return the process's shared ProcessEngine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        # A forked child (e.g. a ProcessPoolExecutor worker) needs its own loop thread
+        if _engine is None or _engine.pid != os.getpid():
+            _engine = ProcessEngine(**_settings)
+            atexit.register(_engine.close)
+        return _engine
+
+
+def run_process(cmd, **kwargs):
+    """Run a command on the shared engine and return its ProcessResult."""
+    return get_engine().run(cmd, **kwargs)
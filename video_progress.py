@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Live ffmpeg progress for the video scripts.
+ffmpeg runs with -progress pipe:1, and its machine-readable key=value blocks are read as they
+arrive. Each block becomes a ProgressEvent passed to an on_progress callback, and
+ProgressDisplay renders the events of one or more concurrent runs on a single status line.
+"""
+
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from video_metrics import summarize_progress
+from video_process import run_process
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """One progress update of an ffmpeg run."""
+    label: str  # What is being encoded (output name, tile, directory, ...)
+    out_time: float  # Seconds of output written so far
+    duration: float  # Expected output duration in seconds (None if unknown)
+    frames: int
+    fps: float  # Encode frame rate
+    speed: float  # Encode speed as a multiple of real time
+    elapsed: float  # Wall seconds since the run started
+    done: bool = False
+
+    @property
+    def fraction(self):
+        """Fraction of the output written, or None if the duration is unknown."""
+        if not self.duration or self.out_time is None:
+            return None
+        return min(1.0, max(0.0, self.out_time / self.duration))
+
+    @property
+    def eta(self):
+        """Estimated wall seconds left, or None if it can't be estimated yet."""
+        if self.done:
+            return 0.0
+        fraction = self.fraction
+        if fraction is None:
+            return None
+        if self.speed:
+            return (self.duration - self.out_time) / self.speed
+        if fraction > 0:
+            return self.elapsed * (1 - fraction) / fraction
+        return None
+
+
+def format_seconds(seconds):
+    """Format seconds as M:SS or H:MM:SS."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def run_ffmpeg(cmd, capture_output=False, metrics=None, on_progress=None, duration=None,
+               label=None, group=None):
+    """
+    Run an ffmpeg command on the shared process engine while reading its -progress stream.
+    on_progress(ProgressEvent) is called for every progress block; duration (seconds of
+    output expected) enables percentages and ETAs; label defaults to the output file name.
+    ffmpeg's log (stderr) is always returned in the result's stderr as text; without
+    capture_output it is also shown as it is written.
+    With metrics, the final progress values are recorded against the current stage.
+    group is the video_process.ProcessGroup to run in, if any.
+    Returns a video_process.ProcessResult (a subprocess.CompletedProcess), whose progress
+    attribute holds the final progress values (see video_metrics.summarize_progress).
+    """
+    if label is None:
+        label = os.path.basename(cmd[-1])
+
+    progress_cmd = [cmd[0], '-progress', 'pipe:1'] + cmd[1:]
+    values = {}
+    start = time.perf_counter()
+
+    def on_start():
+        nonlocal start
+        values.clear()  # A retried run reports its progress from scratch
+        start = time.perf_counter()
+
+    def on_line(line):
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return
+        values[key] = value
+        if key == 'progress' and on_progress is not None:
+            progress = summarize_progress(values)
+            on_progress(ProgressEvent(
+                label=label, out_time=progress['out_time'], duration=duration,
+                frames=progress['frames'], fps=progress['fps'], speed=progress['speed'],
+                elapsed=time.perf_counter() - start, done=value == 'end'
+            ))
+
+    result = run_process(progress_cmd, on_stdout=on_line, on_start=on_start,
+                         echo_stderr=not capture_output, group=group)
+    if on_progress is not None and values.get('progress') != 'end':
+        # Failed and timed-out runs never report progress=end; end them for the display
+        on_progress(ProgressEvent(label=label, out_time=None, duration=duration, frames=None,
+                                  fps=None, speed=None, elapsed=result.elapsed, done=True))
+    result.progress = summarize_progress(values)
+    if metrics is not None:
+        metrics.record_ffmpeg(result.elapsed, result.progress)
+    return result
+
+
+class ProgressDisplay:
+    """
+    Render progress events from any number of concurrent runs as one status line on stderr,
+    e.g. "[2 running] tile_000.mkv 45% ETA 0:12 (96 fps) | tile_001.mkv 30% ...".
+    Callable, so it can be passed directly as an on_progress callback; thread-safe.
+    It is also a writable stream: text written to it goes to output (default: the current
+    sys.stdout) above the status line, so it can be installed with contextlib.redirect_stdout.
+    """
+
+    def __init__(self, stream=None, output=None, interval=0.5):
+        self.stream = stream or sys.stderr
+        self.output = output or sys.stdout
+        self.interval = interval  # Minimum seconds between redraws
+        self.active = {}
+        self._last_draw = 0.0
+        self._width = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.done:
+                self.active.pop(event.label, None)
+            else:
+                self.active[event.label] = event
+
+            now = time.perf_counter()
+            if event.done or now - self._last_draw >= self.interval:
+                self._last_draw = now
+                self._draw()
+
+    @staticmethod
+    def describe(event):
+        """Describe one run's progress in a few words."""
+        parts = [event.label]
+        if event.fraction is not None:
+            parts.append(f"{event.fraction:.0%}")
+        elif event.out_time is not None:
+            parts.append(format_seconds(event.out_time))
+        if event.eta is not None:
+            parts.append(f"ETA {format_seconds(event.eta)}")
+        if event.fps:
+            parts.append(f"({event.fps:.0f} fps)")
+        return " ".join(parts)
+
+    def _draw(self):
+        """Redraw the status line (caller holds the lock)."""
+        if self.active:
+            line = f"[{len(self.active)} running] " + " | ".join(
+                self.describe(event) for event in self.active.values()
+            )
+        else:
+            line = ""
+        self.stream.write("\r" + line.ljust(self._width))
+        if not line:
+            self.stream.write("\r")
+        self.stream.flush()
+        self._width = len(line)
+
+    def write(self, text):
+        """Write text to output above the status line without garbling it."""
+        with self._lock:
+            if self._width:
+                self.stream.write("\r" + " " * self._width + "\r")
+                self.stream.flush()
+                self._width = 0
+            self.output.write(text)
+            self.output.flush()
+            if text.endswith("\n") and self.active:
+                self._draw()
+        return len(text)
+
+    def flush(self):
+        self.output.flush()
+
+    def close(self):
+        """Clear the status line."""
+        with self._lock:
+            self.active.clear()
+            self._draw()
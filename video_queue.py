@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Shared work queue for running the recursive grid driver on several nodes at once.
+Directories are tasks in an SQLite database on the shared file system. Each worker claims
+one task at a time under a lease, renews the leases it holds from a heartbeat thread, and
+takes over tasks whose lease has expired (their worker died), so every directory is built
+by exactly one live worker.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_QUEUE_NAME = '.grid_queue.sqlite'
+# Seconds a claimed task stays leased without a heartbeat
+DEFAULT_LEASE = 60.0
+# A task whose lease expired this many times (its workers kept dying) is marked failed
+DEFAULT_MAX_ATTEMPTS = 3
+# Seconds between checks for reclaimable tasks while other workers finish theirs
+QUEUE_POLL = 2.0
+
+# Task states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def worker_name():
+    """Return a name identifying this worker process across nodes (host:pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of directories shared by every worker of a run.
+    Every worker adds the directories it scans (adding is idempotent), then claims tasks
+    until none are left. Leases are renewed every lease/3 seconds by start_heartbeat();
+    lease times are wall-clock times, so the nodes' clocks must be in sync (NTP).
+    Finished and failed tasks are queued again when they are added with a different
+    fingerprint (their videos or options changed); delete the queue file (or use a new one) to rebuild them all.
+    """
+
+    def __init__(self, path, worker=None, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.worker = worker or worker_name()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.held = set()  # Tasks this worker has claimed and not completed
+        self.lost = set()  # Tasks this worker held whose lease was taken over
+        self.on_lost = None  # Called (from the heartbeat thread) with each lost task
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+        # Transactions are explicit, so that claims can take the write lock up front
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " directory TEXT PRIMARY KEY, state TEXT NOT NULL, worker TEXT,"
+            " lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, output TEXT,"
+            " fingerprint TEXT, updated REAL)"
+        )
+
+    def _transaction(self, statements):
+        """Run statements(conn) in an immediate (write-locked) transaction and return its result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def add(self, directories):
+        """
+        Add directories ({directory: current fingerprint or None}) as pending tasks. Queued
+        ones are kept as they are, except finished or failed ones recorded with another
+        fingerprint, which are queued again with fresh attempts. (Failed tasks without a
+        fingerprint, e.g. ones whose workers kept dying, stay failed.)
+        """
+        def add_all(conn):
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (directory, state, updated) VALUES (?, ?, ?)",
+                [(directory, PENDING, now) for directory in directories]
+            )
+            conn.executemany(
+                "UPDATE tasks SET state=?, worker=NULL, lease_until=NULL, attempts=0, output=NULL,"
+                " fingerprint=NULL, updated=? WHERE directory=? AND state NOT IN (?, ?)"
+                " AND fingerprint IS NOT ? AND (state!=? OR fingerprint IS NOT NULL)",
+                [(PENDING, now, directory, PENDING, RUNNING, fingerprint, FAILED)
+                 for directory, fingerprint in directories.items() if fingerprint is not None]
+            )
+
+        self._transaction(add_all)
+
+    def claim(self):
+        """
+        Claim the next pending task, or one whose lease has expired, and return its directory
+        (None if there is nothing to claim right now). Expired tasks that have used up their
+        attempts are marked failed instead.
+        """
+        def claim_next(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE tasks SET state=?, worker=NULL, updated=?"
+                " WHERE state=? AND lease_until<? AND attempts>=?",
+                (FAILED, now, RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT directory FROM tasks WHERE state=? OR (state=? AND lease_until<?)"
+                " ORDER BY attempts, directory LIMIT 1",
+                (PENDING, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET state=?, worker=?, lease_until=?, attempts=attempts+1, updated=?"
+                " WHERE directory=?",
+                (RUNNING, self.worker, now + self.lease, now, row[0])
+            )
+            self.held.add(row[0])
+            self.lost.discard(row[0])  # Reclaimed after its lease expired elsewhere
+            return row[0]
+
+        return self._transaction(claim_next)
+
+    def renew(self):
+        """
+        Extend the leases of every task this worker holds. Returns the tasks whose lease was
+        lost since the last renewal (taken over by another worker, or failed after its lease
+        expired); they are moved from held to lost.
+        """
+        def renew_all(conn):
+            conn.execute(
+                "UPDATE tasks SET lease_until=? WHERE worker=? AND state=?",
+                (time.time() + self.lease, self.worker, RUNNING)
+            )
+            renewed = {directory for directory, in conn.execute(
+                "SELECT directory FROM tasks WHERE worker=? AND state=?", (self.worker, RUNNING)
+            )}
+            lost = self.held - renewed
+            self.held -= lost
+            self.lost |= lost
+            return lost
+
+        return self._transaction(renew_all)
+
+    def complete(self, directory, state, output=None, fingerprint=None):
+        """
+        Record the final state of a claimed task. Returns False (and records nothing) if the
+        lease was lost to another worker meanwhile, whose result then counts instead.
+        """
+        def complete_task(conn):
+            self.held.discard(directory)
+            if directory in self.lost:
+                return 0
+            return conn.execute(
+                "UPDATE tasks SET state=?, output=?, fingerprint=?, lease_until=NULL, updated=?"
+                " WHERE directory=? AND worker=? AND state=?",
+                (state, output, fingerprint, time.time(), directory, self.worker, RUNNING)
+            ).rowcount
+
+        updated = self._transaction(complete_task)
+        if not updated:
+            self.lost.add(directory)
+        return bool(updated)
+
+    def wait_for_work(self, poll=QUEUE_POLL):
+        """
+        Wait while other workers hold every remaining task. Returns True as soon as a task
+        can be claimed (e.g. a lease expired), or False once every task is finished.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                claimable, running = self._conn.execute(
+                    "SELECT COALESCE(SUM(state=? OR (state=? AND lease_until<?)), 0),"
+                    " COALESCE(SUM(state=?), 0) FROM tasks",
+                    (PENDING, RUNNING, now, RUNNING)
+                ).fetchone()
+            if claimable:
+                return True
+            if not running:
+                return False
+            time.sleep(poll)
+
+    def counts(self):
+        """Number of tasks in each state."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"))
+
+    def start_heartbeat(self):
+        """
+        Renew this worker's leases every lease/3 seconds in a background thread, calling
+        on_lost(directory) for each task whose lease turns out to be lost, so that its build
+        can be stopped.
+        """
+        def beat():
+            while not self._stop.wait(self.lease / 3):
+                try:
+                    lost = self.renew()
+                except sqlite3.Error:
+                    continue  # Try again on the next beat; the lease outlives a few misses
+                for directory in sorted(lost):
+                    if self.on_lost is not None:
+                        self.on_lost(directory)
+
+        self._heartbeat = threading.Thread(target=beat, daemon=True, name='queue-heartbeat')
+        self._heartbeat.start()
+
+    def close(self):
+        """Stop the heartbeat and close the database."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        self._conn.close()
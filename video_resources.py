@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+CPU- and memory-aware resource governor for the video scripts.
+Detects how many CPUs the scripts may really use (affinity mask and cgroup CPU quota, not
+just the host's core count) and how much memory is available (MemAvailable and the cgroup
+memory limit), splits the CPUs between concurrent jobs as ffmpeg thread budgets, and admits
+new jobs only while there is memory for them.
+"""
+
+import functools
+import math
+import os
+
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+# Seconds between memory checks while a job waits for admission
+ADMISSION_POLL = 0.5
+
+
+def read_first_line(path):
+    """Return the stripped first line of a file, or None if it can't be read."""
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def visible_cpus():
+    """Number of CPUs this process may run on (its affinity mask)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cgroup_cpu_quota():
+    """The cgroup CPU quota in CPUs (e.g. 2.5), or None if unlimited or unknown."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    line = read_first_line(os.path.join(CGROUP_ROOT, 'cpu.max'))
+    if line:
+        quota, _, period = line.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota is -1 when unlimited
+    quota = read_first_line(os.path.join(CGROUP_ROOT, 'cpu', 'cpu.cfs_quota_us'))
+    period = read_first_line(os.path.join(CGROUP_ROOT, 'cpu', 'cpu.cfs_period_us'))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_memory():
+    """Bytes of memory available to new processes (MemAvailable, capped by the cgroup limit)."""
+    available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+
+    # cgroup v2 (memory.max / memory.current) or v1 (limit_in_bytes / usage_in_bytes)
+    for limit_file, usage_file in (('memory.max', 'memory.current'),
+                                   ('memory/memory.limit_in_bytes',
+                                    'memory/memory.usage_in_bytes')):
+        limit = read_first_line(os.path.join(CGROUP_ROOT, limit_file))
+        usage = read_first_line(os.path.join(CGROUP_ROOT, usage_file))
+        if limit and usage and limit.isdigit() and usage.isdigit():
+            # v1 reports "no limit" as a huge number, which min() ignores
+            headroom = max(0, int(limit) - int(usage))
+            available = headroom if available is None else min(available, headroom)
+            break
+
+    return available
+
+
+def format_bytes(size):
+    """Format a byte count as e.g. '3.2 GiB'."""
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class ResourceGovernor:
+    """
+    Splits the machine between concurrent ffmpeg jobs.
+    cpus is the number of CPUs the scripts may keep busy: the affinity mask, reduced to
+    the cgroup quota (rounded up) when one is set.
+    """
+
+    def __init__(self):
+        self.visible_cpus = visible_cpus()
+        self.cpu_quota = cgroup_cpu_quota()
+        self.cpus = self.visible_cpus
+        if self.cpu_quota is not None:
+            self.cpus = max(1, min(self.visible_cpus, math.ceil(self.cpu_quota)))
+
+    def threads_for(self, concurrent, budget=None):
+        """
+        ffmpeg threads for each of `concurrent` processes sharing budget CPUs (default: all).
+        Returns 0 (let ffmpeg decide) when a single process may use every CPU it can see,
+        because ffmpeg's own choice is then already right.
+        """
+        budget = budget or self.cpus
+        if concurrent <= 1 and budget >= self.visible_cpus:
+            return 0
+        return max(1, budget // max(1, concurrent))
+
+    def split(self, jobs, job_memory=None):
+        """
+        Return (jobs, threads per job) for running up to `jobs` jobs at once.
+        Jobs are capped at the CPU count and, given a per-job memory estimate in bytes,
+        at the number of jobs that fit in the currently available memory.
+        """
+        jobs = max(1, min(jobs, self.cpus))
+        if job_memory:
+            memory = available_memory()
+            if memory is not None:
+                jobs = max(1, min(jobs, memory // job_memory))
+        return jobs, max(1, self.cpus // jobs)
+
+    @staticmethod
+    def has_memory(job_memory):
+        """
+        Whether a new job with an estimated job_memory bytes fits in the available memory
+        (True if it can't be measured). Callers hold jobs back while this is False and
+        other jobs are running, checking again every ADMISSION_POLL seconds.
+        """
+        memory = available_memory()
+        return memory is None or memory >= job_memory
+
+    def describe(self):
+        """Describe the detected CPUs and memory in one line."""
+        cpus = f"{self.cpus} CPUs"
+        if self.cpu_quota is not None:
+            cpus += f" (cgroup quota {self.cpu_quota:g} of {self.visible_cpus} visible)"
+        elif self.visible_cpus != (os.cpu_count() or self.visible_cpus):
+            cpus += f" (affinity, {os.cpu_count()} on the host)"
+        memory = available_memory()
+        if memory is not None:
+            return f"{cpus}, {format_bytes(memory)} memory available"
+        return cpus
+
+
+@functools.lru_cache(maxsize=None)
+def get_governor():
+    """Return the process's ResourceGovernor (resources are detected once)."""
+    return ResourceGovernor()
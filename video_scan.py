@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Single-pass directory scanner for the recursive grid driver.
+Walks a tree once with os.scandir, collecting every directory together with its MP4 files
+and their stat results, so nothing is listed or stat-ed twice. Top-level branches can be
+walked in parallel, and directories are yielded as soon as they are found.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+
+# Directories found by parallel walkers but not yet consumed
+SCAN_QUEUE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class ScannedDirectory:
+    """A directory found by the scanner and the MP4 files directly inside it."""
+    path: str
+    # {video path: (size, mtime_ns)}, from the scan's cached DirEntry stats
+    videos: dict = field(default_factory=dict)
+
+
+def scan_directory(path):
+    """
+    List one directory. Returns (subdirectories, videos): the non-hidden subdirectories as
+    sorted (path, is_symlink) pairs, and {path: (size, mtime_ns)} of its non-hidden MP4 files.
+    Unreadable directories and entries are skipped, like os.walk does.
+    """
+    subdirs = []
+    videos = {}
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append((entry.path, entry.is_symlink()))
+                    elif entry.name.endswith('.mp4') and entry.is_file():
+                        st = entry.stat()
+                        videos[entry.path] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return sorted(subdirs), videos
+
+
+def walk_branch(path, is_symlink=False):
+    """
+    Yield a ScannedDirectory for path and every directory below it, depth first in name
+    order. Like os.walk, symlinked directories are listed but not descended into.
+    """
+    stack = [(path, is_symlink)]
+    while stack:
+        directory, is_symlink = stack.pop()
+        subdirs, videos = scan_directory(directory)
+        yield ScannedDirectory(directory, videos)
+        if not is_symlink:
+            stack.extend(reversed(subdirs))
+
+
+def scan_tree(start_dir, workers=1):
+    """
+    Yield a ScannedDirectory for every non-hidden directory below start_dir (not start_dir
+    itself), as it is found. With workers > 1, the top-level branches are walked in parallel
+    threads (useful on network file systems) and results arrive in completion order.
+    """
+    branches, _ = scan_directory(start_dir)
+    if workers <= 1 or len(branches) <= 1:
+        for path, is_symlink in branches:
+            yield from walk_branch(path, is_symlink)
+        return
+
+    results = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    stop = threading.Event()
+    branch_done = object()
+
+    def put(item):
+        # Walkers wait while the consumer is behind, unless it has stopped
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def walk(path, is_symlink):
+        try:
+            for directory in walk_branch(path, is_symlink):
+                if stop.is_set():
+                    return
+                put(directory)
+        finally:
+            put(branch_done)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(walk, path, is_symlink) for path, is_symlink in branches]
+        remaining = len(futures)
+        while remaining:
+            item = results.get()
+            if item is branch_done:
+                remaining -= 1
+            else:
+                yield item
+        for future in futures:
+            future.result()  # Re-raise unexpected errors from the walkers
+    finally:
+        # Also reached when the consumer stops early: let the walkers finish quickly
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)